@@ -17,21 +17,58 @@ Usage (API server):
 Usage (live webcam):
   python main.py --webcam
   python main.py --webcam --camera 1 --fps 10
+  python main.py --webcam --change-threshold 0.04 --max-stale 2   # motion-gated (0 = every frame)
+  python main.py --webcam --smooth 0.35 --confident-fps 3         # smoothed diagnosis, slower once stable
+
+Usage (offline bulk scan of an image directory tree, resumable):
+  python main.py --scan-dir /data/field_dump --out results.csv
+  python main.py --scan-dir /data/field_dump --out results.parquet --workers 16 --batch 64
+
+Usage (headless video file / RTSP stream analysis → detection timeline):
+  python main.py --video walkthrough.mp4 --out timeline.csv
+  python main.py --video rtsp://10.0.0.7:8554/greenhouse --out timeline.json --max-seconds 600
+
+Usage (HTTP load test — in-process app, or a running server's URL; JSON report):
+  python main.py --loadtest --concurrency 32 --duration 30
+  python main.py --loadtest http://10.0.0.5:8000 --corpus samples/ --report load.json
+  MODEL_PATH=synthetic python main.py --loadtest   # simulated model latency
+
+Usage (micro-benchmarks of the hot path, compared against a saved baseline):
+  python main.py --bench --save bench_baseline.json
+  python main.py --bench --baseline bench_baseline.json --threshold 0.15
 
 Set MODEL_PATH env var to point to your trained .keras file:
   export MODEL_PATH=mobilenetv2_best.keras
+or to a lightweight .tflite / .onnx export (INT8-quantized variants included):
+  export MODEL_PATH=mobilenetv2_int8.tflite
+
+Inference tuning (optional):
+  export BATCH_MAX_SIZE=16        # micro-batch size; 1 disables batching
+  export BATCH_MAX_WAIT_MS=5      # max time a request waits for batch-mates
+  export INFERENCE_EXECUTOR=thread  # "thread" or "process"
+  export INFERENCE_WORKERS=8      # executor size (default: CPU count)
+  export KERAS_XLA=1              # XLA-compile the Keras serving function
+  export GATE_MODEL_PATH=mobilenetv2_035_128.tflite  # cheap gate model in front
+  export CASCADE_THRESHOLD=0.9    # gate confidence that skips the full model
+
+Zero-downtime model updates (optional):
+  export MODEL_REGISTRY_DIR=models  # versioned model files + manifest.json
+  export ADMIN_TOKEN=change-me      # enables POST /api/admin/models/swap
+  export MODEL_WATCH_S=5            # also swap when the manifest / model file changes
+
+Profiling (optional):
+  curl -X POST -H "X-Admin-Token: $ADMIN_TOKEN" "localhost:8000/api/admin/profile?seconds=30" > app.folded
+  export PROFILE_EVERY_N=100        # write a profile of every 100th /api/predict to PROFILE_DIR
 """
 
 from __future__ import annotations
 
 import logging
 import os
-import time
 from contextlib import asynccontextmanager
 from pathlib import Path
 
 import numpy as np
-from PIL import Image as PILImage
 
 try:
     import cv2
@@ -41,11 +78,15 @@ except ImportError:
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
 from models.schemas import HealthResponse
-from routers import predict, fertilizer, history, chatbot
+from routers import predict, fertilizer, history, chatbot, admin
+from services import metrics
+from services.model_registry import PredictorLeaseMiddleware, create_model_manager
+from services.near_duplicate import create_near_duplicate_index
+from services.prediction_cache import create_prediction_cache
 from services.predictor import load_predictor, CLASS_NAMES
 
 # ── Logging ───────────────────────────────────────────────────────────────────
@@ -66,12 +107,18 @@ async def lifespan(app: FastAPI):
     logger.info("=" * 60)
     logger.info("  PlantCare AI Backend  v%s  starting up …", API_VERSION)
     logger.info("=" * 60)
-    app.state.predictor = load_predictor(MODEL_PATH)
+    app.state.models = create_model_manager(app.state, MODEL_PATH)
+    app.state.models.load_initial()        # sets app.state.predictor
     app.state.history: list = []
+    app.state.prediction_cache = create_prediction_cache()
+    app.state.near_duplicates  = create_near_duplicate_index()
+    app.state.models.start_watching()
+    metrics.bind_app_state(app.state)
     logger.info("Predictor ready. Supported classes: %d", len(CLASS_NAMES))
     logger.info("API docs available at /docs  and  /redoc")
     logger.info("-" * 60)
     yield
+    await app.state.models.close()
     logger.info("PlantCare AI Backend shutting down. Goodbye!")
 
 
@@ -103,7 +150,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Cache"],   # readable by the web / mobile client
 )
+app.add_middleware(PredictorLeaseMiddleware)   # pins each request to one model version
+app.add_middleware(metrics.MetricsMiddleware)   # outermost: times the full request
 
 # ── Static files ──────────────────────────────────────────────────────────────
 static_dir = Path("static")
@@ -116,6 +166,7 @@ app.include_router(predict.router)
 app.include_router(fertilizer.router)
 app.include_router(history.router)
 app.include_router(chatbot.router)
+app.include_router(admin.router)
 
 
 # ── Global exception handler ──────────────────────────────────────────────────
@@ -136,16 +187,24 @@ async def generic_exception_handler(request: Request, exc: Exception):
 @app.get("/health", response_model=HealthResponse, tags=["System"], summary="API health check")
 async def health(request: Request):
     predictor    = request.app.state.predictor
-    model_loaded = predictor.__class__.__name__ == "KerasPredictor"
+    model_loaded = getattr(predictor, "model_loaded", False)
+    models       = request.app.state.models
     return HealthResponse(
         status="ok",
         model_loaded=model_loaded,
-        model_path=MODEL_PATH,
+        model_path=models.model_path,
+        model_version=models.version,
         supported_classes=len(CLASS_NAMES),
         version=API_VERSION,
     )
 
 
+# ── Prometheus metrics ────────────────────────────────────────────────────────
+@app.get("/metrics", tags=["System"], summary="Prometheus metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # ── Root ──────────────────────────────────────────────────────────────────────
 @app.get("/", tags=["System"], summary="API root / welcome")
 async def root():
@@ -155,12 +214,18 @@ async def root():
         "status":  "running",
         "endpoints": {
             "health":               "GET  /health",
+            "metrics":              "GET  /metrics",
             "predict":              "POST /api/predict",
+            "predict_batch":        "POST /api/predict/batch",
+            "predict_stream":       "POST /api/predict/stream",
             "classes":              "GET  /api/classes",
             "fertilizers":          "GET  /api/fertilizers",
             "fertilizer_recommend": "POST /api/fertilizers/recommend",
             "history":              "GET  /api/history",
             "clear_history":        "DEL  /api/history",
+            "admin_models":         "GET  /api/admin/models",
+            "admin_model_swap":     "POST /api/admin/models/swap",
+            "admin_profile":        "POST /api/admin/profile",
             "docs":                 "GET  /docs",
             "redoc":                "GET  /redoc",
         },
@@ -181,9 +246,10 @@ _webcam_predictor = None   # lazy-loaded once per webcam session
 
 
 def _get_webcam_predictor():
+    # Single caller: skip the micro-batcher's wait and the worker processes.
     global _webcam_predictor
     if _webcam_predictor is None:
-        _webcam_predictor = load_predictor(MODEL_PATH)
+        _webcam_predictor = load_predictor(MODEL_PATH, batching=False, workers=0)
     return _webcam_predictor
 
 
@@ -191,6 +257,9 @@ def predict_frame(frame: np.ndarray) -> tuple[str, float]:
     """
     Run MobileNetV2 inference on a single OpenCV BGR frame.
 
+    The frame goes straight into the model input buffer (resize + BGR → RGB
+    + scale in one pass, see ``preprocess_array_into``) — no JPEG round-trip.
+
     Parameters
     ----------
     frame : np.ndarray  — BGR image array from cv2.VideoCapture
@@ -199,33 +268,59 @@ def predict_frame(frame: np.ndarray) -> tuple[str, float]:
     -------
     (class_name, confidence)  e.g. ('Tomato___Late_blight', 0.943)
     """
-    import io
-    # OpenCV gives BGR → convert to RGB before passing to model
-    rgb     = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    pil_img = PILImage.fromarray(rgb)
-    buf     = io.BytesIO()
-    pil_img.save(buf, format="JPEG")
-
-    result = _get_webcam_predictor().predict(buf.getvalue())
+    result = _get_webcam_predictor().predict_array(frame, bgr=True)
     return result["class_name"], result["confidence"]
 
 
-def run_local_webcam(camera_index: int = 0, target_fps: int = 15):
+def _describe(class_name: str) -> tuple[str, bool]:
+    """'Tomato___Late_blight' → ('Tomato — Late blight', is_healthy)."""
+    parts      = class_name.split("___")
+    plant_name = parts[0].replace("_", " ")
+    condition  = parts[1].replace("_", " ") if len(parts) > 1 else "Unknown"
+    return f"{plant_name} — {condition}", "healthy" in condition.lower()
+
+
+def run_local_webcam(
+    camera_index: int = 0,
+    target_fps: int = 15,
+    change_threshold: float | None = None,
+    max_stale_s: float | None = None,
+    smoothing: float | None = None,
+    confident_fps: float | None = None,
+):
     """
     Continuous real-time webcam inference using OpenCV.
     Displays live overlay with predicted class + confidence bar.
     Press 'q' to quit.
 
+    Capture and inference run on their own threads (services.video_pipeline):
+    the model always takes the newest frame, skipping any that arrived while
+    it was busy, and the preview redraws every camera frame with the latest
+    result — so it stays at camera frame rate whatever the model latency.
+    While the scene is static the model is not re-run (see ChangeDetector),
+    which keeps CPU use and heat down on low-end laptops. The overlay shows a
+    temporally smoothed diagnosis (see TemporalSmoother); once it is stable,
+    inference slows to ``confident_fps``.
+
     Parameters
     ----------
-    camera_index : int  — webcam device index (0 = default built-in camera)
-    target_fps   : int  — max inference FPS (15 is smooth without CPU overload)
+    camera_index     : int    — webcam device index (0 = default built-in camera)
+    target_fps       : int    — max inference FPS (15 is smooth without CPU overload)
+    change_threshold : float  — scene-change score that triggers inference (0 = every frame)
+    max_stale_s      : float  — re-classify an unchanged scene at least this often
+    smoothing        : float  — EMA weight of each new prediction (0 = show raw per-frame output)
+    confident_fps    : float  — inference FPS while the smoothed diagnosis is confident
     """
     if not CV2_AVAILABLE:
         print("❌  opencv-python is not installed.")
         print("    Run:  pip install opencv-python")
         return
 
+    from services.video_pipeline import (
+        CHANGE_THRESHOLD, CONFIDENT_FPS, MAX_STALE_S, SMOOTHING_ALPHA, CaptureThread, ChangeDetector,
+        InferenceWorker, LatestSlot, RateMeter, TemporalSmoother,
+    )
+
     cap = cv2.VideoCapture(camera_index)
     if not cap.isOpened():
         print(f"❌  Cannot open camera {camera_index}.")
@@ -236,45 +331,58 @@ def run_local_webcam(camera_index: int = 0, target_fps: int = 15):
     cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
     cap.set(cv2.CAP_PROP_FPS, 30)
 
-    frame_interval  = 1.0 / target_fps
-    last_inference  = 0.0
+    threshold = CHANGE_THRESHOLD if change_threshold is None else change_threshold
+    max_stale = MAX_STALE_S if max_stale_s is None else max_stale_s
+    detector  = ChangeDetector(threshold, max_stale) if threshold > 0 else None
+    alpha     = SMOOTHING_ALPHA if smoothing is None else smoothing
+    smoother  = TemporalSmoother(alpha) if alpha > 0 else None
+    frames    = LatestSlot()
+    capture   = CaptureThread(cap, frames)
+    predictor = _get_webcam_predictor()   # load the model before the camera starts streaming
+    worker    = InferenceWorker(
+        frames, predictor.predict_array, target_fps, detector,
+        smoother, CONFIDENT_FPS if confident_fps is None else confident_fps,
+    )
+    capture.start()
+    worker.start()
+
+    render_meter    = RateMeter()
+    render_seq      = 0
+    render_dropped  = 0
     last_class      = "Initialising..."
     last_confidence = 0.0
     last_is_healthy = False
-    fps_display     = 0
-    fps_timer       = time.time()
-    frame_count     = 0
+    last_raw        = 0.0
+    last_stable     = False
+    result_seq      = 0
 
     print("🎥  Webcam started — hold a plant leaf up to the camera  |  Press 'q' to quit")
 
     while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("⚠️   Frame capture failed — check camera connection.")
-            break
-
-        now = time.time()
-
-        # ── Inference at controlled FPS ───────────────────────────────────
-        if now - last_inference >= frame_interval:
-            try:
-                class_name, conf = predict_frame(frame)
-                parts            = class_name.split("___")
-                plant_name       = parts[0].replace("_", " ")
-                condition        = parts[1].replace("_", " ") if len(parts) > 1 else "Unknown"
-                last_class       = f"{plant_name} — {condition}"
-                last_confidence  = conf
-                last_is_healthy  = "healthy" in condition.lower()
-            except Exception as exc:
-                logger.warning("Webcam inference error: %s", exc)
-            last_inference = now
-
-        # ── FPS counter ───────────────────────────────────────────────────
-        frame_count += 1
-        if now - fps_timer >= 1.0:
-            fps_display = frame_count
-            frame_count = 0
-            fps_timer   = now
+        seq, item = frames.wait_newer(render_seq, timeout=1.0)
+        if seq == render_seq:
+            if frames.closed:
+                if capture.failed:
+                    print("⚠️   Frame capture failed — check camera connection.")
+                break
+            continue
+        render_dropped += seq - render_seq - 1
+        render_seq      = seq
+        frame           = item[1].copy()   # the inference thread may still be reading the original
+
+        # ── Latest inference result ───────────────────────────────────────
+        new_result_seq, result = worker.results.latest()
+        if new_result_seq != result_seq:
+            result_seq = new_result_seq
+            if result.smoothed is not None:
+                class_name, last_confidence = result.smoothed.class_name, result.smoothed.confidence
+            else:
+                class_name, last_confidence = result.value["class_name"], result.value["confidence"]
+            last_class, last_is_healthy = _describe(class_name)
+            last_raw    = result.value["confidence"]
+            last_stable = result.smoothed is not None and result.smoothed.confident
+
+        render_meter.tick()
 
         # ── HUD overlay ───────────────────────────────────────────────────
         h, w       = frame.shape[:2]
@@ -294,10 +402,20 @@ def run_local_webcam(camera_index: int = 0, target_fps: int = 15):
                     (10, 28), cv2.FONT_HERSHEY_DUPLEX, 0.75, status_col, 2)
         cv2.putText(frame, last_class,
                     (10, 58), cv2.FONT_HERSHEY_SIMPLEX, 0.62, (255, 255, 255), 1)
-        cv2.putText(frame, f"Confidence: {last_confidence * 100:.1f}%",
+        confidence_text = f"Confidence: {last_confidence * 100:.1f}%"
+        if smoother is not None:
+            confidence_text += f"  (frame {last_raw * 100:.0f}%{', stable' if last_stable else ''})"
+        cv2.putText(frame, confidence_text,
                     (10, 82), cv2.FONT_HERSHEY_SIMPLEX, 0.58, (200, 200, 200), 1)
-        cv2.putText(frame, f"FPS: {fps_display}",
+        cv2.putText(frame, f"FPS: {render_meter.rate:.0f}",
                     (w - 100, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (180, 180, 180), 1)
+        cv2.putText(frame, f"Model: {worker.meter.rate:.1f}/s  {worker.latency * 1000:.0f} ms",
+                    (w - 210, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (180, 180, 180), 1)
+        cv2.putText(frame, f"Queue: {worker.backlog}  Dropped: {worker.skipped} / {render_dropped}",
+                    (w - 210, 72), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (180, 180, 180), 1)
+        if detector is not None:
+            cv2.putText(frame, f"Static: {worker.gated}  Change: {detector.score:.3f}",
+                        (w - 210, 94), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (180, 180, 180), 1)
         cv2.putText(frame, "Press 'q' to quit",
                     (10, h - 12), cv2.FONT_HERSHEY_SIMPLEX, 0.48, (160, 160, 160), 1)
 
@@ -312,7 +430,10 @@ def run_local_webcam(camera_index: int = 0, target_fps: int = 15):
             print("\n👋  Webcam closed by user.")
             break
 
-    cap.release()
+    capture.stop()
+    worker.stop()
+    capture.join(timeout=2)   # the capture thread releases ``cap`` on its way out
+    worker.join(timeout=5)
     cv2.destroyAllWindows()
 
 
@@ -324,9 +445,81 @@ if __name__ == "__main__":
     if "--webcam" in sys.argv:
         # python main.py --webcam
         # python main.py --webcam --camera 1 --fps 10
+        # python main.py --webcam --change-threshold 0.04 --max-stale 2   (0 → classify every frame)
+        # python main.py --webcam --smooth 0.35 --confident-fps 3         (--smooth 0 → raw output)
         cam_idx    = int(sys.argv[sys.argv.index("--camera") + 1]) if "--camera" in sys.argv else 0
         target_fps = int(sys.argv[sys.argv.index("--fps")    + 1]) if "--fps"    in sys.argv else 15
-        run_local_webcam(camera_index=cam_idx, target_fps=target_fps)
+        change     = float(sys.argv[sys.argv.index("--change-threshold") + 1]) if "--change-threshold" in sys.argv else None
+        max_stale  = float(sys.argv[sys.argv.index("--max-stale")        + 1]) if "--max-stale"        in sys.argv else None
+        smoothing  = float(sys.argv[sys.argv.index("--smooth")           + 1]) if "--smooth"           in sys.argv else None
+        slow_fps   = float(sys.argv[sys.argv.index("--confident-fps")    + 1]) if "--confident-fps"    in sys.argv else None
+        run_local_webcam(camera_index=cam_idx, target_fps=target_fps,
+                         change_threshold=change, max_stale_s=max_stale,
+                         smoothing=smoothing, confident_fps=slow_fps)
+    elif "--scan-dir" in sys.argv:
+        # python main.py --scan-dir DIR [--out results.csv] [--workers N] [--batch 32]
+        from services.bulk_scanner import scan_directory
+        scan_dir   = sys.argv[sys.argv.index("--scan-dir") + 1]
+        out_path   = sys.argv[sys.argv.index("--out")     + 1] if "--out"     in sys.argv else "scan_results.csv"
+        workers    = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else None
+        batch_size = int(sys.argv[sys.argv.index("--batch")   + 1]) if "--batch"   in sys.argv else 32
+        summary = scan_directory(scan_dir, out_path, MODEL_PATH, workers=workers, batch_size=batch_size)
+        print(f"✅  Scan finished: {summary}")
+    elif "--video" in sys.argv:
+        # python main.py --video PATH_OR_URL [--out timeline.csv|.json] [--sample scene|stride]
+        #                [--stride N] [--batch 32] [--change-threshold 0.04] [--max-stale 2] [--max-seconds S]
+        if not CV2_AVAILABLE:
+            print("❌  opencv-python is not installed.")
+            print("    Run:  pip install opencv-python")
+            sys.exit(1)
+        from services.video_analysis import analyze_video
+        from services.video_pipeline import CHANGE_THRESHOLD, MAX_STALE_S
+        source     = sys.argv[sys.argv.index("--video") + 1]
+        out_path   = sys.argv[sys.argv.index("--out")    + 1] if "--out"    in sys.argv else "video_timeline.csv"
+        sample     = sys.argv[sys.argv.index("--sample") + 1] if "--sample" in sys.argv else "scene"
+        stride     = int(sys.argv[sys.argv.index("--stride") + 1])  if "--stride" in sys.argv else None
+        batch_size = int(sys.argv[sys.argv.index("--batch")  + 1])  if "--batch"  in sys.argv else 32
+        change     = float(sys.argv[sys.argv.index("--change-threshold") + 1]) if "--change-threshold" in sys.argv else CHANGE_THRESHOLD
+        max_stale  = float(sys.argv[sys.argv.index("--max-stale")        + 1]) if "--max-stale"        in sys.argv else MAX_STALE_S
+        max_secs   = float(sys.argv[sys.argv.index("--max-seconds")      + 1]) if "--max-seconds"      in sys.argv else None
+        summary = analyze_video(source, out_path, MODEL_PATH, sample=sample, stride=stride, batch_size=batch_size,
+                                change_threshold=change, max_stale_s=max_stale, max_seconds=max_secs)
+        print(f"✅  Video analysis finished: {summary}")
+    elif "--loadtest" in sys.argv:
+        # python main.py --loadtest [URL] [--concurrency 16] [--duration 30] [--requests N]
+        #                [--corpus DIR] [--mix predict=8,recommend=1,history=1] [--cache] [--report FILE]
+        import json
+        from services.load_generator import DEFAULT_MIX, run_load_test
+        argv = sys.argv
+        nxt  = argv[argv.index("--loadtest") + 1] if argv.index("--loadtest") + 1 < len(argv) else ""
+        report = run_load_test(
+            app=app,
+            url=nxt if nxt.startswith(("http://", "https://")) else None,
+            concurrency=int(argv[argv.index("--concurrency") + 1]) if "--concurrency" in argv else 16,
+            duration=float(argv[argv.index("--duration") + 1])    if "--duration"    in argv else 30.0,
+            requests=int(argv[argv.index("--requests") + 1])      if "--requests"    in argv else None,
+            corpus=argv[argv.index("--corpus") + 1]                if "--corpus"      in argv else None,
+            mix=argv[argv.index("--mix") + 1]                      if "--mix"         in argv else DEFAULT_MIX,
+            use_cache="--cache" in argv,
+        )
+        text = json.dumps(report, indent=2)
+        if "--report" in argv:
+            Path(argv[argv.index("--report") + 1]).write_text(text + "\n", encoding="utf-8")
+        print(text)
+    elif "--bench" in sys.argv:
+        # python main.py --bench [--save FILE] [--baseline FILE] [--threshold 0.15] [--only PREFIX]
+        import json
+        from services.microbench import run_suite
+        argv = sys.argv
+        report, passed = run_suite(
+            MODEL_PATH,
+            baseline=argv[argv.index("--baseline") + 1]         if "--baseline"  in argv else None,
+            save=argv[argv.index("--save") + 1]                 if "--save"      in argv else None,
+            threshold=float(argv[argv.index("--threshold") + 1]) if "--threshold" in argv else 0.15,
+            only=argv[argv.index("--only") + 1]                 if "--only"      in argv else None,
+        )
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if passed else 1)
     else:
         # python main.py  →  starts the FastAPI server
         uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
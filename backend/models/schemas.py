@@ -44,6 +44,22 @@ class PredictionResponse(BaseModel):
     data: Optional[PredictionResult] = None
 
 
+class BatchPredictionItem(BaseModel):
+    index: int = Field(..., description="Position of the image in the upload (zip members expanded in archive order)")
+    filename: Optional[str] = None
+    success: bool
+    error: Optional[str] = None
+    data: Optional[PredictionResult] = None
+
+
+class BatchPredictionResponse(BaseModel):
+    success: bool
+    message: str
+    count: int
+    failed: int
+    results: list[BatchPredictionItem]
+
+
 # ── Fertilizer ────────────────────────────────────────────────────────────────
 
 class FertilizerItem(BaseModel):
@@ -118,9 +134,18 @@ class HealthResponse(BaseModel):
     status: str
     model_loaded: bool
     model_path: str
+    model_version: Optional[str] = None
     supported_classes: int
     version: str
 
+
+# ── Admin ─────────────────────────────────────────────────────────────────────
+
+class ModelSwapRequest(BaseModel):
+    version: Optional[str] = Field(
+        None, description="Registry version to serve; omit to reload the manifest's active version"
+    )
+
 # ── Chatbot ───────────────────────────────────────────────────────────────────
 
 class ChatMessage(BaseModel):
@@ -0,0 +1,133 @@
+"""
+Admin Router
+============
+GET  /api/admin/models      — Serving model, swap progress and registry contents.
+POST /api/admin/models/swap — Load a model version in the background and hot-swap to it.
+POST /api/admin/profile     — Sample the live process for N seconds; collapsed-stack profile.
+
+Every admin route requires the ``X-Admin-Token`` header to match the
+ADMIN_TOKEN env var; with ADMIN_TOKEN unset the admin API is disabled.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+import os
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from models.schemas import ModelSwapRequest
+from services.model_registry import ModelManager, SwapInProgress
+from services.profiler import SamplingProfiler
+
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+_profile_lock = asyncio.Lock()   # one profile at a time — overlapping samplers see each other
+
+
+def require_admin(x_admin_token: str | None = Header(None)) -> None:
+    """FastAPI dependency — rejects requests without the configured admin token."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API disabled — set ADMIN_TOKEN to enable it.")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token header.")
+
+
+router = APIRouter(prefix="/api/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+
+def get_model_manager(request: Request) -> ModelManager:
+    """FastAPI dependency — retrieves the ModelManager that owns app.state.predictor."""
+    return request.app.state.models
+
+
+# ── GET /api/admin/models ─────────────────────────────────────────────────────
+
+@router.get(
+    "/models",
+    summary="Serving model and registry status",
+    description=(
+        "Which model version is serving, how many requests are using it, the "
+        "progress of any background swap and every version in the registry manifest."
+    ),
+)
+async def models_status(manager: ModelManager = Depends(get_model_manager)):
+    try:
+        return {"success": True, "data": manager.describe()}
+    except (OSError, ValueError) as exc:
+        raise HTTPException(status_code=500, detail=f"Could not read model registry: {exc}")
+
+
+# ── POST /api/admin/models/swap ───────────────────────────────────────────────
+
+@router.post(
+    "/models/swap",
+    status_code=202,
+    summary="Hot-swap the serving model",
+    description=(
+        "Loads and warms the requested registry version (or the manifest's active "
+        "version / MODEL_PATH when omitted) in the background, then swaps it in "
+        "atomically. In-flight requests finish on the old model, which is closed "
+        "once they drain. Poll GET /api/admin/models for progress."
+    ),
+)
+async def swap_model(
+    body: ModelSwapRequest | None = None,
+    manager: ModelManager = Depends(get_model_manager),
+):
+    version = body.version if body else None
+    try:
+        if manager.swapping:
+            raise SwapInProgress(f"Swap to {manager.status.get('target')} still {manager.status['state']}")
+        if version is not None and manager.registry is None:
+            raise KeyError("No model registry configured (MODEL_REGISTRY_DIR) — omit 'version' to reload MODEL_PATH")
+        manager.start_swap(version, persist=version is not None)   # manifest updated only on success
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=str(exc.args[0]))
+    except SwapInProgress as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except (OSError, ValueError) as exc:
+        raise HTTPException(status_code=500, detail=f"Could not read model registry: {exc}")
+
+    return JSONResponse(
+        status_code=202,
+        content={"success": True, "message": "Model swap started.", "data": manager.status},
+    )
+
+
+# ── POST /api/admin/profile ───────────────────────────────────────────────────
+
+@router.post(
+    "/profile",
+    response_class=PlainTextResponse,
+    summary="Sample the live process",
+    description=(
+        "Samples every thread's Python stack ``hz`` times a second for ``seconds`` "
+        "seconds while the server keeps serving, then returns the counts in "
+        "collapsed-stack format (flamegraph.pl / speedscope / inferno input). "
+        "Threads waiting on locks, queues or sockets are left out unless idle=true."
+    ),
+)
+async def profile(
+    seconds: float = Query(10.0, gt=0, le=300, description="Sampling duration"),
+    hz: float = Query(100.0, ge=1, le=1000, description="Samples per second"),
+    idle: bool = Query(False, description="Include threads parked in a wait"),
+):
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running.")
+    async with _profile_lock:
+        profiler = SamplingProfiler(hz, include_idle=idle).start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={
+            "X-Profile-Samples":  str(profiler.samples),
+            "X-Profile-Duration": f"{profiler.duration:.3f}",
+        },
+    )
@@ -15,9 +15,10 @@ from datetime import datetime, timezone
 from fastapi import APIRouter, HTTPException, Request
 
 from models.schemas import ChatMessage, ChatRequest, ChatResponse, ChatHistoryResponse
+from services.metrics import ServerTimingRoute, timed_stage
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/api", tags=["Chatbot"])
+router = APIRouter(prefix="/api", tags=["Chatbot"], route_class=ServerTimingRoute)
 
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "")
 
@@ -90,14 +91,15 @@ async def chat(payload: ChatRequest, request: Request):
         messages.append({"role": entry["role"], "content": entry["content"]})
     messages.append({"role": "user", "content": payload.message})
 
-    # Call Groq API
+    # Call Groq API (upstream time shows up as "llm" in the Server-Timing header)
     try:
-        completion = client.chat.completions.create(
-            model=payload.model or "llama3-8b-8192",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1024,
-        )
+        with timed_stage("llm"):
+            completion = client.chat.completions.create(
+                model=payload.model or "llama3-8b-8192",
+                messages=messages,
+                temperature=0.7,
+                max_tokens=1024,
+            )
         reply = completion.choices[0].message.content
     except Exception as exc:
         logger.exception("Groq API error: %s", exc)
@@ -2,37 +2,72 @@
 Prediction Router
 =================
 POST /api/predict  — Upload a leaf image; get disease classification + treatment plan.
+                     Repeat uploads are served from the exact-bytes prediction cache or,
+                     for re-encoded copies, the perceptual-hash near-duplicate index
+                     (send ``Cache-Control: no-cache`` to bypass both).
+POST /api/predict/batch — Upload many leaf images (or a .zip of them) in one request.
+POST /api/predict/stream — Same input; NDJSON results streamed as each image finishes.
 GET  /api/classes  — List all 38 supported disease classes.
+GET  /api/inference/stats — Executor, batching and worker utilization figures.
+
+Every response carries a Server-Timing header (read, cache, preprocess, queue,
+inference, lookup, build, total) — see services.metrics.ServerTimingRoute.
+With PROFILE_EVERY_N set, every Nth /api/predict request is sampled into a
+collapsed-stack file — see services.profiler.
 """
 
 from __future__ import annotations
 
+import asyncio
+import io
+import os
 import uuid
 import logging
+import time
+import zipfile
 from datetime import datetime, timezone
-from typing import Any
+from typing import Any, AsyncIterator
 
-from fastapi import APIRouter, File, UploadFile, HTTPException, Request, Depends
-from fastapi.responses import JSONResponse
+import numpy as np
+from PIL import Image
+from fastapi import APIRouter, File, UploadFile, HTTPException, Request, Response, Depends, Header
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from models.schemas import (
+    BatchPredictionItem,
+    BatchPredictionResponse,
     PredictionResponse,
     PredictionResult,
     PesticideInfo,
     ClassesResponse,
 )
+from services.metrics import ServerTimingRoute, record_stage, timed_stage
+from services.near_duplicate import NearDuplicateIndex, perceptual_hash
+from services.prediction_cache import PredictionCache
+from services.predictor import decode_image
+from services.profiler import sampled_request_profile
 from services.treatment_db import get_treatment, get_all_classes
 
 logger = logging.getLogger(__name__)
-router = APIRouter(prefix="/api", tags=["Disease Detection"])
+router = APIRouter(prefix="/api", tags=["Disease Detection"], route_class=ServerTimingRoute)
 
 ALLOWED_MIME_TYPES = {"image/jpeg", "image/png", "image/webp", "image/bmp"}
 MAX_FILE_SIZE_BYTES = 16 * 1024 * 1024  # 16 MB
 
+ZIP_MIME_TYPES        = {"application/zip", "application/x-zip-compressed"}
+IMAGE_EXTENSIONS      = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+MAX_BATCH_IMAGES      = int(os.environ.get("MAX_BATCH_IMAGES", "256"))
+MAX_BATCH_TOTAL_BYTES = 256 * 1024 * 1024  # 256 MB across all images (incl. unzipped)
+MAX_STREAM_IMAGES     = int(os.environ.get("MAX_STREAM_IMAGES", "10000"))
+STREAM_CONCURRENCY    = int(os.environ.get("STREAM_CONCURRENCY", "32"))  # images in flight per stream
+
 
 def get_predictor(request: Request):
-    """FastAPI dependency — retrieves the shared predictor from app state."""
-    return request.app.state.predictor
+    """
+    FastAPI dependency — the InferencePool this request is pinned to
+    (see PredictorLeaseMiddleware), else the current one from app state.
+    """
+    return getattr(request.state, "predictor", None) or request.app.state.predictor
 
 
 def get_history(request: Request) -> list:
@@ -40,6 +75,140 @@ def get_history(request: Request) -> list:
     return request.app.state.history
 
 
+def get_prediction_cache(request: Request) -> PredictionCache:
+    """FastAPI dependency — retrieves the shared content-addressed prediction cache."""
+    return request.app.state.prediction_cache
+
+
+def get_near_duplicates(request: Request) -> NearDuplicateIndex:
+    """FastAPI dependency — retrieves the shared perceptual-hash near-duplicate index."""
+    return request.app.state.near_duplicates
+
+
+def _bypass_cache(cache_control: str | None) -> bool:
+    directives = (cache_control or "").lower()
+    return "no-cache" in directives or "no-store" in directives
+
+
+def _model_input_and_hash(image_bytes: bytes, size: tuple[int, int]) -> tuple[np.ndarray, int]:
+    """
+    Decode + resize an upload to the model's (H, W) input as uint8 and pHash
+    that — the model then gets the same pixels, so the image is decoded once.
+    """
+    started = time.perf_counter()
+    img     = decode_image(image_bytes, (size[1], size[0])).resize((size[1], size[0]), Image.BILINEAR)
+    phash   = perceptual_hash(img)
+    record_stage("preprocess", time.perf_counter() - started)
+    return np.asarray(img), phash
+
+
+async def _cached_predict(
+    image_bytes: bytes,
+    predictor,
+    cache: PredictionCache,
+    near_dups: NearDuplicateIndex,
+    use_cache: bool,
+) -> tuple[dict[str, Any], str]:
+    """
+    Exact-bytes cache → near-duplicate index → model.
+    Returns the raw prediction and its source: HIT, NEAR, MISS or BYPASS.
+    """
+    if not use_cache:
+        return await predictor.predict_async(image_bytes), "BYPASS"
+
+    # "cache" times the lookups only; decoding for the pHash is recorded as "preprocess".
+    started = time.perf_counter()
+    cache_key = cache.key(image_bytes)
+    raw = cache.get(cache_key)
+    record_stage("cache", time.perf_counter() - started)
+    if raw is not None:
+        return raw, "HIT"
+
+    # Decode once: the model input feeds both the pHash and, on a miss, the model.
+    # Process workers decode for themselves — decoding here would put it back on
+    # this process's GIL and pickle the pixels to them — so they skip the index.
+    phash = pixels = None
+    if near_dups.enabled and predictor.kind == "thread":
+        try:
+            pixels, phash = await asyncio.to_thread(
+                _model_input_and_hash, image_bytes, predictor.input_size,
+            )
+        except Exception:
+            pixels = phash = None   # undecodable — let the predictor raise the real error
+        if phash is not None:
+            started = time.perf_counter()
+            raw = near_dups.lookup(phash)
+            record_stage("cache", time.perf_counter() - started)
+            if raw is not None:
+                cache.put(cache_key, raw)
+                return raw, "NEAR"
+
+    # Runs on the inference executor
+    if pixels is not None:
+        raw = await predictor.predict_array_async(pixels, bgr=False)
+    else:
+        raw = await predictor.predict_async(image_bytes)
+    if getattr(predictor, "retired", False):
+        return raw, "MISS"   # model was swapped out mid-request — don't cache its output
+    cache.put(cache_key, raw)
+    if phash is not None:
+        near_dups.add(phash, raw)
+    return raw, "MISS"
+
+
+def _build_result(raw: dict[str, Any]) -> PredictionResult:
+    """Combine raw predictor output with the treatment database entry."""
+    class_name: str = raw["class_name"]
+    confidence: float = raw["confidence"]
+    top5: list[dict] = raw.get("top5", [])
+
+    started   = time.perf_counter()
+    treatment = get_treatment(class_name)
+    looked_up = time.perf_counter()
+    record_stage("lookup", looked_up - started)
+    if treatment is None:
+        raise HTTPException(
+            status_code=500,
+            detail=f"No treatment data found for class '{class_name}'.",
+        )
+
+    pesticides = [PesticideInfo(**p) for p in treatment["pesticides"]]
+    result = PredictionResult(
+        class_name=class_name,
+        plant=treatment["plant"],
+        condition=treatment["condition"],
+        is_healthy=treatment["is_healthy"],
+        confidence=round(confidence, 4),
+        confidence_pct=f"{confidence * 100:.1f}%",
+        severity_risk=treatment["severity_risk"],
+        description=treatment["description"],
+        pesticides=pesticides,
+        organic=treatment["organic"],
+        prevention=treatment["prevention"],
+        etl=treatment["etl"],
+        fertilizer_note=treatment["fertilizer_note"],
+        top5=top5,
+    )
+    record_stage("build", time.perf_counter() - looked_up)
+    return result
+
+
+def _record_history(history: list, result: PredictionResult) -> None:
+    history.append({
+        "id": str(uuid.uuid4()),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "class_name": result.class_name,
+        "plant": result.plant,
+        "condition": result.condition,
+        "is_healthy": result.is_healthy,
+        "confidence": result.confidence,
+        "severity_risk": result.severity_risk,
+    })
+    # Keep only the last 500 entries to prevent unbounded growth
+    if len(history) > 500:
+        del history[0]
+
+
 # ── POST /api/predict ─────────────────────────────────────────────────────────
 
 @router.post(
@@ -51,11 +220,16 @@ def get_history(request: Request) -> list:
         "classifies the image into one of 38 disease/healthy categories and "
         "returns pesticide and organic treatment recommendations."
     ),
+    dependencies=[Depends(sampled_request_profile("predict"))],
 )
 async def predict(
+    response: Response,
     file: UploadFile = File(..., description="Leaf image (JPEG/PNG/WEBP, max 16 MB)"),
+    cache_control: str | None = Header(None, description="Send 'no-cache' to skip the prediction cache"),
     predictor=Depends(get_predictor),
     history: list = Depends(get_history),
+    cache: PredictionCache = Depends(get_prediction_cache),
+    near_dups: NearDuplicateIndex = Depends(get_near_duplicates),
 ):
     # ── Validate file type ────────────────────────────────────────────────────
     if file.content_type not in ALLOWED_MIME_TYPES:
@@ -66,7 +240,8 @@ async def predict(
         )
 
     # ── Read & size-check ─────────────────────────────────────────────────────
-    image_bytes = await file.read()
+    with timed_stage("read"):
+        image_bytes = await file.read()
     if len(image_bytes) > MAX_FILE_SIZE_BYTES:
         raise HTTPException(
             status_code=413,
@@ -75,73 +250,327 @@ async def predict(
     if len(image_bytes) == 0:
         raise HTTPException(status_code=400, detail="Uploaded file is empty.")
 
-    # ── Run model inference ───────────────────────────────────────────────────
+    # ── Cache lookups, then model inference ───────────────────────────────────
     try:
-        raw = predictor.predict(image_bytes)
+        raw, cache_status = await _cached_predict(
+            image_bytes, predictor, cache, near_dups, use_cache=not _bypass_cache(cache_control),
+        )
     except Exception as exc:
         logger.exception("Inference error: %s", exc)
         raise HTTPException(status_code=500, detail=f"Inference failed: {exc}")
+    response.headers["X-Cache"] = cache_status
 
-    class_name: str = raw["class_name"]
-    confidence: float = raw["confidence"]
-    top5: list[dict] = raw.get("top5", [])
-
-    # ── Look up treatment info ────────────────────────────────────────────────
-    treatment = get_treatment(class_name)
-    if treatment is None:
-        raise HTTPException(
-            status_code=500,
-            detail=f"No treatment data found for class '{class_name}'.",
-        )
-
-    # ── Build response ────────────────────────────────────────────────────────
-    pesticides = [PesticideInfo(**p) for p in treatment["pesticides"]]
-    result = PredictionResult(
-        class_name=class_name,
-        plant=treatment["plant"],
-        condition=treatment["condition"],
-        is_healthy=treatment["is_healthy"],
-        confidence=round(confidence, 4),
-        confidence_pct=f"{confidence * 100:.1f}%",
-        severity_risk=treatment["severity_risk"],
-        description=treatment["description"],
-        pesticides=pesticides,
-        organic=treatment["organic"],
-        prevention=treatment["prevention"],
-        etl=treatment["etl"],
-        fertilizer_note=treatment["fertilizer_note"],
-        top5=top5,
-    )
+    # ── Look up treatment info & build response ───────────────────────────────
+    result = _build_result(raw)
 
     # ── Persist to in-memory history ──────────────────────────────────────────
-    history.append({
-        "id": str(uuid.uuid4()),
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "class_name": class_name,
-        "plant": treatment["plant"],
-        "condition": treatment["condition"],
-        "is_healthy": treatment["is_healthy"],
-        "confidence": round(confidence, 4),
-        "severity_risk": treatment["severity_risk"],
-    })
-    # Keep only the last 500 entries to prevent unbounded growth
-    if len(history) > 500:
-        del history[0]
+    with timed_stage("build"):
+        _record_history(history, result)
 
     logger.info(
-        "Prediction: %s | Confidence: %.2f%% | File: %s",
-        class_name,
-        confidence * 100,
+        "Prediction: %s | Confidence: %.2f%% | File: %s | Cache: %s",
+        result.class_name,
+        result.confidence * 100,
         file.filename,
+        response.headers["X-Cache"],
     )
 
     return PredictionResponse(
         success=True,
-        message=f"Disease detection complete — {treatment['condition']} identified.",
+        message=f"Disease detection complete — {result.condition} identified.",
         data=result,
     )
 
 
+# ── POST /api/predict/batch ───────────────────────────────────────────────────
+
+class _BatchTooLarge(Exception):
+    pass
+
+
+def _expand_zip(archive: bytes, budget: int) -> list[tuple[str, bytes | str]]:
+    """Image members of a zip archive, in archive order; oversized members become errors."""
+    items: list[tuple[str, bytes | str]] = []
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        for info in zf.infolist():
+            name = info.filename
+            if info.is_dir() or name.startswith("__MACOSX/") or os.path.basename(name).startswith("."):
+                continue
+            if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            if len(items) >= MAX_BATCH_IMAGES:
+                raise _BatchTooLarge(f"More than {MAX_BATCH_IMAGES} images in upload.")
+            if info.file_size > MAX_FILE_SIZE_BYTES:
+                items.append((name, "File too large. Max allowed: 16 MB."))
+                continue
+            budget -= info.file_size
+            if budget < 0:
+                raise _BatchTooLarge("Uncompressed upload exceeds 256 MB.")
+            items.append((name, zf.read(info)))
+    return items
+
+
+async def _collect_images(files: list[UploadFile]) -> list[tuple[str | None, bytes | str]]:
+    """
+    Flatten the upload into (filename, bytes) pairs; per-image problems are
+    returned as (filename, error message) so one bad file doesn't fail the batch.
+    """
+    items: list[tuple[str | None, bytes | str]] = []
+    budget = MAX_BATCH_TOTAL_BYTES
+
+    for upload in files:
+        data = await upload.read()
+        is_zip = upload.content_type in ZIP_MIME_TYPES or (upload.filename or "").lower().endswith(".zip")
+
+        if is_zip:
+            try:
+                members = await asyncio.to_thread(_expand_zip, data, budget)
+            except zipfile.BadZipFile:
+                items.append((upload.filename, "Corrupt or unreadable zip archive."))
+                continue
+            items.extend(members)
+            budget -= sum(len(m) for _, m in members if isinstance(m, bytes))
+        elif upload.content_type not in ALLOWED_MIME_TYPES:
+            items.append((upload.filename, f"Unsupported media type '{upload.content_type}'."))
+        elif len(data) == 0:
+            items.append((upload.filename, "Uploaded file is empty."))
+        elif len(data) > MAX_FILE_SIZE_BYTES:
+            items.append((upload.filename, "File too large. Max allowed: 16 MB."))
+        else:
+            budget -= len(data)
+            items.append((upload.filename, data))
+
+        if len(items) > MAX_BATCH_IMAGES:
+            raise _BatchTooLarge(f"More than {MAX_BATCH_IMAGES} images in upload.")
+        if budget < 0:
+            raise _BatchTooLarge("Upload exceeds 256 MB in total.")
+    return items
+
+
+@router.post(
+    "/predict/batch",
+    response_model=BatchPredictionResponse,
+    summary="Detect plant disease in many leaf images at once",
+    description=(
+        "Upload several leaf images — individually and/or as .zip archives — in "
+        "a single request. Images are decoded in parallel and run through the "
+        "model in batches; each gets its own result (or error) in upload order, "
+        "with the same treatment recommendations as /api/predict."
+    ),
+)
+async def predict_batch(
+    files: list[UploadFile] = File(..., description="Leaf images (JPEG/PNG/WEBP/BMP) and/or .zip archives"),
+    predictor=Depends(get_predictor),
+    history: list = Depends(get_history),
+    cache: PredictionCache = Depends(get_prediction_cache),
+):
+    try:
+        items = await _collect_images(files)
+    except _BatchTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    if not items:
+        raise HTTPException(status_code=400, detail="No images found in upload.")
+
+    # ── Exact-cache hits first; only misses go to the model ───────────────────
+    raws: list[dict[str, Any] | Exception | None] = [None] * len(items)
+    keys: list[str | None] = [None] * len(items)
+    pending: list[int] = []
+    for i, (_, payload) in enumerate(items):
+        if not isinstance(payload, bytes):
+            continue
+        if cache.enabled:
+            keys[i] = cache.key(payload)
+            raws[i] = cache.get(keys[i])
+        if raws[i] is None:
+            pending.append(i)
+
+    if pending:
+        outputs = await predictor.predict_many_async([items[i][1] for i in pending])
+        cacheable = not getattr(predictor, "retired", False)   # swapped out mid-request — don't cache
+        for i, out in zip(pending, outputs):
+            raws[i] = out
+            if cacheable and keys[i] is not None and not isinstance(out, Exception):
+                cache.put(keys[i], out)
+
+    # ── Per-image results ─────────────────────────────────────────────────────
+    results: list[BatchPredictionItem] = []
+    for i, ((filename, payload), raw) in enumerate(zip(items, raws)):
+        if not isinstance(payload, bytes):
+            results.append(BatchPredictionItem(index=i, filename=filename, success=False, error=payload))
+            continue
+        if isinstance(raw, Exception):
+            results.append(BatchPredictionItem(
+                index=i, filename=filename, success=False, error=f"Inference failed: {raw}",
+            ))
+            continue
+        try:
+            result = _build_result(raw)
+        except HTTPException as exc:
+            results.append(BatchPredictionItem(index=i, filename=filename, success=False, error=exc.detail))
+            continue
+        _record_history(history, result)
+        results.append(BatchPredictionItem(index=i, filename=filename, success=True, data=result))
+
+    failed = sum(not r.success for r in results)
+    hits   = sum(isinstance(payload, bytes) for _, payload in items) - len(pending)
+    logger.info("Batch prediction: %d images | %d failed | %d cache hits", len(results), failed, hits)
+
+    return BatchPredictionResponse(
+        success=failed < len(results),
+        message=f"Batch detection complete — {len(results) - failed} of {len(results)} images classified.",
+        count=len(results),
+        failed=failed,
+        results=results,
+    )
+
+
+# ── POST /api/predict/stream ──────────────────────────────────────────────────
+
+def _is_image_member(info: zipfile.ZipInfo) -> bool:
+    name = info.filename
+    return (
+        not info.is_dir()
+        and not name.startswith("__MACOSX/")
+        and not os.path.basename(name).startswith(".")
+        and os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+    )
+
+
+async def _iter_uploads(files: list[UploadFile]) -> AsyncIterator[tuple[str | None, bytes | str]]:
+    """
+    Lazily yield (filename, bytes-or-error) for every image in the upload.
+    Zip archives are read member by member straight from the spooled upload
+    file, so at most one image per in-flight slot is ever held in memory.
+    """
+    for upload in files:
+        is_zip = upload.content_type in ZIP_MIME_TYPES or (upload.filename or "").lower().endswith(".zip")
+
+        if is_zip:
+            try:
+                archive = await asyncio.to_thread(zipfile.ZipFile, upload.file)
+            except zipfile.BadZipFile:
+                yield upload.filename, "Corrupt or unreadable zip archive."
+                continue
+            with archive:
+                for info in archive.infolist():
+                    if not _is_image_member(info):
+                        continue
+                    if info.file_size > MAX_FILE_SIZE_BYTES:
+                        yield info.filename, "File too large. Max allowed: 16 MB."
+                        continue
+                    yield info.filename, await asyncio.to_thread(archive.read, info)
+            continue
+
+        if upload.content_type not in ALLOWED_MIME_TYPES:
+            yield upload.filename, f"Unsupported media type '{upload.content_type}'."
+            continue
+        data = await upload.read()
+        if len(data) == 0:
+            yield upload.filename, "Uploaded file is empty."
+        elif len(data) > MAX_FILE_SIZE_BYTES:
+            yield upload.filename, "File too large. Max allowed: 16 MB."
+        else:
+            yield upload.filename, data
+
+
+async def _stream_one(
+    index: int,
+    filename: str | None,
+    payload: bytes | str,
+    predictor,
+    history: list,
+    cache: PredictionCache,
+    near_dups: NearDuplicateIndex,
+) -> BatchPredictionItem:
+    if not isinstance(payload, bytes):
+        return BatchPredictionItem(index=index, filename=filename, success=False, error=payload)
+    try:
+        raw, _ = await _cached_predict(payload, predictor, cache, near_dups, use_cache=True)
+        result = _build_result(raw)
+    except HTTPException as exc:
+        return BatchPredictionItem(index=index, filename=filename, success=False, error=exc.detail)
+    except Exception as exc:
+        return BatchPredictionItem(index=index, filename=filename, success=False, error=f"Inference failed: {exc}")
+    _record_history(history, result)
+    return BatchPredictionItem(index=index, filename=filename, success=True, data=result)
+
+
+async def _ndjson_results(
+    files: list[UploadFile],
+    predictor,
+    history: list,
+    cache: PredictionCache,
+    near_dups: NearDuplicateIndex,
+) -> AsyncIterator[str]:
+    """Keep at most STREAM_CONCURRENCY images in flight; emit each as soon as it completes."""
+    in_flight: set[asyncio.Task] = set()
+    count = failed = 0
+
+    def _drain(done: set[asyncio.Task]) -> list[str]:
+        nonlocal failed
+        lines = []
+        for task in done:
+            item = task.result()
+            failed += not item.success
+            lines.append(item.model_dump_json() + "\n")
+        return lines
+
+    try:
+        async for filename, payload in _iter_uploads(files):
+            if count >= MAX_STREAM_IMAGES:
+                yield BatchPredictionItem(
+                    index=count, filename=filename, success=False,
+                    error=f"Stream limit of {MAX_STREAM_IMAGES} images reached; remaining files skipped.",
+                ).model_dump_json() + "\n"
+                failed += 1
+                break
+            if len(in_flight) >= STREAM_CONCURRENCY:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for line in _drain(done):
+                    yield line
+            in_flight.add(asyncio.create_task(
+                _stream_one(count, filename, payload, predictor, history, cache, near_dups)
+            ))
+            count += 1
+
+        while in_flight:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for line in _drain(done):
+                yield line
+    finally:
+        for task in in_flight:   # client went away — stop scheduling work for it
+            task.cancel()
+
+    logger.info("Streamed prediction: %d images | %d failed", count, failed)
+    yield f'{{"summary": true, "count": {count}, "failed": {failed}}}\n'
+
+
+@router.post(
+    "/predict/stream",
+    summary="Stream per-image predictions as NDJSON",
+    description=(
+        "Same input as /api/predict/batch (image files and/or .zip archives), "
+        "but results are streamed back as newline-delimited JSON — one "
+        "BatchPredictionItem per line, emitted as soon as that image's inference "
+        "completes (so lines may arrive out of order; use the ``index`` field). "
+        "A final ``{\"summary\": true, ...}`` line closes the stream. Server "
+        "memory stays constant regardless of how many images are uploaded."
+    ),
+    response_class=StreamingResponse,
+)
+async def predict_stream(
+    files: list[UploadFile] = File(..., description="Leaf images (JPEG/PNG/WEBP/BMP) and/or .zip archives"),
+    predictor=Depends(get_predictor),
+    history: list = Depends(get_history),
+    cache: PredictionCache = Depends(get_prediction_cache),
+    near_dups: NearDuplicateIndex = Depends(get_near_duplicates),
+):
+    return StreamingResponse(
+        _ndjson_results(files, predictor, history, cache, near_dups),
+        media_type="application/x-ndjson",
+    )
+
+
 # ── GET /api/classes ──────────────────────────────────────────────────────────
 
 @router.get(
@@ -152,3 +581,29 @@ async def predict(
 async def get_classes():
     classes = get_all_classes()
     return ClassesResponse(success=True, count=len(classes), classes=classes)
+
+
+# ── GET /api/inference/stats ──────────────────────────────────────────────────
+
+@router.get(
+    "/inference/stats",
+    summary="Inference executor statistics",
+    description=(
+        "Executor kind and size, micro-batching counters, prediction cache and "
+        "near-duplicate hit/miss counters and — when the shared-memory worker "
+        "backend is active — per-worker utilization."
+    ),
+)
+async def inference_stats(
+    predictor=Depends(get_predictor),
+    cache: PredictionCache = Depends(get_prediction_cache),
+    near_dups: NearDuplicateIndex = Depends(get_near_duplicates),
+):
+    return {
+        "success": True,
+        "data": {
+            **predictor.stats(),
+            "prediction_cache": cache.stats(),
+            "near_duplicates":  near_dups.stats(),
+        },
+    }
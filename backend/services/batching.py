@@ -0,0 +1,221 @@
+"""
+Micro-Batching Scheduler
+========================
+Collects concurrent single-image prediction requests and runs them through the
+model as one batched forward pass, then fans the results back to each caller.
+
+A batch is dispatched as soon as either limit is hit:
+  - BATCH_MAX_SIZE images are waiting (default 16), or
+  - BATCH_MAX_WAIT_MS has elapsed since the first image arrived (default 5 ms).
+
+Set BATCH_MAX_SIZE=1 to disable batching entirely.
+
+Callers decode straight into slots of a preallocated TensorPool and the
+scheduler gathers those slots into one preallocated batch buffer, so the hot
+path does no per-request array allocation.
+
+When the wrapped predictor only runs fixed shapes cheaply (XLA-compiled Keras),
+batches are zero-padded up to the next power-of-two bucket, and those buckets
+are exactly what ``warmup`` compiles ahead of time.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any
+
+import numpy as np
+
+from services.metrics import observe_batch, record_stage
+from services.predictor import IMG_SIZE, format_prediction
+from services.tensor_pool import TensorPool
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_SIZE    = int(os.environ.get("BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+
+_STOP = object()   # queue sentinel — shuts the scheduler thread down
+
+
+def batch_buckets(max_batch_size: int) -> list[int]:
+    """Powers of two below ``max_batch_size``, plus the max itself: 16 → [1, 2, 4, 8, 16]."""
+    sizes, n = [], 1
+    while n < max_batch_size:
+        sizes.append(n)
+        n *= 2
+    sizes.append(max_batch_size)
+    return sizes
+
+
+def record_future_timing(future: Future) -> None:
+    """Attribute a resolved ``submit`` future's queue wait and model time to the current request."""
+    timing = getattr(future, "timing", None)
+    if timing is not None:
+        record_stage("queue", timing[0])
+        record_stage("inference", timing[1])
+
+
+class BatchingPredictor:
+    """
+    Wraps any predictor exposing ``predict_tensor(batch) -> probs`` and
+    coalesces concurrent calls into batches on a single scheduler thread.
+
+    Callers preprocess on their own thread (decode + resize run in parallel),
+    then block on a Future until their row of the batched output is ready.
+    The pool holds enough slots for the next batches to be decoded while the
+    current one is on the model.
+    """
+
+    def __init__(self, predictor: Any, max_batch_size: int = 16, max_wait_ms: float = 5.0):
+        self.predictor      = predictor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait       = max(0.0, max_wait_ms) / 1000.0
+        self.buckets        = batch_buckets(self.max_batch_size)
+        self._pad           = getattr(predictor, "pad_batches", False)
+
+        self.input_size    = getattr(predictor, "input_size", IMG_SIZE)
+        self.pool          = TensorPool(4 * self.max_batch_size, self.input_size)
+        self._batch_buffer = np.zeros((self.buckets[-1], *self.pool.slots.shape[1:]), dtype=np.float32)
+
+        self._queue: queue.Queue = queue.Queue()
+        self._batches      = 0
+        self._items        = 0
+        self._largest      = 0
+        self._stats_lock   = threading.Lock()
+        self._thread       = threading.Thread(
+            target=self._run, name="inference-batcher", daemon=True,
+        )
+        self._thread.start()
+        logger.info("Micro-batching enabled (max %d images / %.1f ms).",
+                    self.max_batch_size, self.max_wait * 1000)
+
+    @property
+    def model_loaded(self) -> bool:
+        return getattr(self.predictor, "model_loaded", False)
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def submit(self, image_bytes: bytes) -> Future:
+        """
+        Preprocess ``image_bytes`` into a pool slot on the calling thread and
+        queue it; the returned Future resolves to its (38,) probabilities.
+        """
+        return self._enqueue(self.pool.fill, image_bytes)
+
+    def submit_array(self, frame: np.ndarray, bgr: bool = True) -> Future:
+        """``submit`` for a raw uint8 (H, W, 3) frame (no encode / decode)."""
+        return self._enqueue(self.pool.fill_array, frame, bgr)
+
+    def _enqueue(self, fill, *args) -> Future:
+        started = time.perf_counter()
+        slot = fill(*args)
+        future: Future = Future()
+        future.enqueued_at = time.perf_counter()
+        record_stage("preprocess", future.enqueued_at - started)
+        self._queue.put((slot, future))
+        return future
+
+    def predict(self, image_bytes: bytes) -> dict[str, Any]:
+        probs = self.submit(image_bytes).result()
+        return format_prediction(probs)
+
+    def predict_array(self, frame: np.ndarray, bgr: bool = True) -> dict[str, Any]:
+        return format_prediction(self.submit_array(frame, bgr).result())
+
+    async def predict_async(self, image_bytes: bytes) -> dict[str, Any]:
+        loop   = asyncio.get_running_loop()
+        future = await loop.run_in_executor(None, contextvars.copy_context().run, self.submit, image_bytes)
+        probs  = await asyncio.wrap_future(future)
+        record_future_timing(future)
+        return format_prediction(probs)
+
+    def warmup(self) -> None:
+        """Trace / compile every batch size the scheduler can dispatch."""
+        if hasattr(self.predictor, "warmup"):
+            self.predictor.warmup(self.buckets)
+
+    def stats(self) -> dict[str, Any]:
+        with self._stats_lock:
+            stats = {
+                "batches":        self._batches,
+                "images":         self._items,
+                "mean_batch":     round(self._items / self._batches, 2) if self._batches else 0.0,
+                "largest_batch":  self._largest,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms":    self.max_wait * 1000,
+                "pool_in_use":    self.pool.in_use,
+            }
+        if hasattr(self.predictor, "stats"):
+            stats["model"] = self.predictor.stats()   # e.g. cascade escalation rate
+        return stats
+
+    def close(self) -> None:
+        """Stop the scheduler thread after it drains already-queued requests."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5)
+
+    # ── Scheduler thread ──────────────────────────────────────────────────────
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            batch    = [item]
+            stopping = False
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    nxt = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stopping = True
+                    break
+                batch.append(nxt)
+
+            self._dispatch(batch)
+            if stopping:
+                return
+
+    def _dispatch(self, batch: list[tuple[int, Future]]) -> None:
+        dispatched = time.perf_counter()
+        slots = [slot for slot, _ in batch]
+        try:
+            tensors = self.pool.gather(slots, self._batch_buffer)
+        finally:
+            for slot in slots:
+                self.pool.release(slot)   # data now lives in the batch buffer
+
+        try:
+            if self._pad:
+                size = next(b for b in self.buckets if b >= len(batch))
+                self._batch_buffer[len(batch):size] = 0.0
+                tensors = self._batch_buffer[:size]
+            probs   = self.predictor.predict_tensor(tensors)[:len(batch)]
+            elapsed = time.perf_counter() - dispatched
+        except Exception as exc:
+            logger.exception("Batched inference failed (%d images): %s", len(batch), exc)
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+
+        with self._stats_lock:
+            self._batches += 1
+            self._items   += len(batch)
+            self._largest  = max(self._largest, len(batch))
+        observe_batch(len(batch), elapsed)
+
+        for (_, future), row in zip(batch, probs):
+            future.timing = (dispatched - future.enqueued_at, elapsed)   # (queue, inference)
+            future.set_result(row)
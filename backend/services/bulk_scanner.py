@@ -0,0 +1,314 @@
+"""
+Offline Bulk Scanner
+====================
+Classifies every leaf image under a directory tree (drone / field-camera
+dumps of 100k+ images) and streams one result row per image to CSV or Parquet.
+
+Pipeline:
+  walk tree → process pool decodes + resizes to 224×224 uint8 (all cores)
+            → main process packs batches → predictor.predict_tensor
+            → rows appended to the output file → paths appended to checkpoint
+
+The checkpoint (``<output>.checkpoint``) lists every relative path whose row
+is safely on disk, so an interrupted multi-hour run resumes where it stopped.
+A path is checkpointed only after its row is readable: CSV rows once they are
+flushed, Parquet rows once the part file holding them has been closed (parts
+are written as ``*.tmp`` and renamed on close, every ``PARQUET_PART_ROWS``
+rows). A crash can repeat work but never lose a row. Images that failed to
+decode or classify are written with their error but not checkpointed, so the
+next run retries them (their output then holds one row per attempt).
+
+Usage:
+  python main.py --scan-dir /data/field_dump --out results.csv
+  python main.py --scan-dir /data/field_dump --out results.parquet --workers 16 --batch 64
+"""
+
+from __future__ import annotations
+
+import csv
+import functools
+import json
+import logging
+import multiprocessing
+import os
+import time
+from pathlib import Path
+from typing import Any, Iterator, TextIO
+
+import numpy as np
+from PIL import Image
+
+from services.predictor import IMG_SIZE, decode_image, format_prediction, load_predictor
+from services.treatment_db import get_treatment
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+COLUMNS = [
+    "path", "class_name", "plant", "condition", "is_healthy", "confidence",
+    "severity_risk", "treatment_summary", "top5", "error",
+]
+
+PARQUET_PART_ROWS = 10_000   # rows per Parquet part file — the most a hard crash can cost
+
+_SCALE = np.float32(1 / 127.5)
+
+
+# ── Decode workers ────────────────────────────────────────────────────────────
+
+def _decode(path: str, size: tuple[int, int] = IMG_SIZE) -> tuple[str, np.ndarray | None, str | None]:
+    """Runs in a pool process: decode + resize to uint8 (4× less to pickle than float32)."""
+    try:
+        img = decode_image(Path(path).read_bytes(), size).resize(size, Image.BILINEAR)
+        return path, np.asarray(img, dtype=np.uint8), None
+    except Exception as exc:
+        return path, None, f"{type(exc).__name__}: {exc}"
+
+
+# ── Output writers ────────────────────────────────────────────────────────────
+
+class _CsvSink:
+    def __init__(self, path: Path, checkpoint: TextIO):
+        new = not path.exists() or path.stat().st_size == 0
+        self._fh = open(path, "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._fh, fieldnames=COLUMNS)
+        self._checkpoint = checkpoint
+        if new:
+            self._writer.writeheader()
+
+    def write(self, rows: list[dict[str, Any]], done: list[str]) -> None:
+        """Append ``rows``; checkpoint ``done`` once they are flushed."""
+        self._writer.writerows(rows)
+        self._fh.flush()
+        _mark_done(self._checkpoint, done)
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class _ParquetSink:
+    """
+    Parquet files can't be appended to and are unreadable until their footer
+    is written on close, so rows go to part files of ``PARQUET_PART_ROWS``
+    rows each, and a part's paths are checkpointed only once it is closed.
+    """
+
+    def __init__(self, path: Path, checkpoint: TextIO):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("❌  Parquet output needs pyarrow.  Run:  pip install pyarrow")
+
+        self._pa = pa
+        self._pq = pq
+        self._schema = pa.schema([
+            ("path", pa.string()), ("class_name", pa.string()), ("plant", pa.string()),
+            ("condition", pa.string()), ("is_healthy", pa.bool_()), ("confidence", pa.float32()),
+            ("severity_risk", pa.string()), ("treatment_summary", pa.string()),
+            ("top5", pa.string()), ("error", pa.string()),
+        ])
+        self._path       = path
+        self._checkpoint = checkpoint
+        self._part       = 0
+        self._writer     = None
+        self._target: Path | None = None
+        self._rows       = 0
+        self._pending: list[str] = []   # paths whose rows are in the open part
+
+    def _open_part(self) -> None:
+        target = self._path
+        while target.exists():
+            self._part += 1
+            target = self._path.with_name(f"{self._path.stem}.part{self._part:03d}{self._path.suffix}")
+        self._target = target
+        self._writer = self._pq.ParquetWriter(str(target.with_name(target.name + ".tmp")), self._schema)
+        logger.info("Writing Parquet rows to %s", target)
+
+    def _close_part(self) -> None:
+        if self._writer is None:
+            return
+        self._writer.close()
+        tmp = self._target.with_name(self._target.name + ".tmp")
+        os.replace(tmp, self._target)
+        _mark_done(self._checkpoint, self._pending)
+        self._writer, self._rows, self._pending = None, 0, []
+
+    def write(self, rows: list[dict[str, Any]], done: list[str]) -> None:
+        """Append ``rows``; ``done`` is checkpointed when their part file closes."""
+        if self._writer is None:
+            self._open_part()
+        columns = {name: [row.get(name) for row in rows] for name in COLUMNS}
+        self._writer.write_table(self._pa.Table.from_pydict(columns, schema=self._schema))
+        self._pending.extend(done)
+        self._rows += len(rows)
+        if self._rows >= PARQUET_PART_ROWS:
+            self._close_part()
+
+    def close(self) -> None:
+        self._close_part()
+
+
+def _open_sink(path: Path, checkpoint: TextIO) -> _CsvSink | _ParquetSink:
+    sink = _ParquetSink if path.suffix.lower() == ".parquet" else _CsvSink
+    return sink(path, checkpoint)
+
+
+def _mark_done(checkpoint: TextIO, rel_paths: list[str]) -> None:
+    if rel_paths:
+        checkpoint.write("".join(f"{r}\n" for r in rel_paths))
+        checkpoint.flush()
+
+
+# ── Helpers ───────────────────────────────────────────────────────────────────
+
+def _walk_images(root: Path) -> Iterator[Path]:
+    """Deterministic (sorted) walk so resumed runs visit files in the same order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS and not name.startswith("."):
+                yield Path(dirpath) / name
+
+
+def _treatment_summary(treatment: dict[str, Any]) -> str:
+    chemicals = ", ".join(p["name"] for p in treatment["pesticides"] if p["type"] == "chemical")
+    organic   = treatment["organic"][0] if treatment["organic"] else ""
+    parts = [treatment["condition"]]
+    if chemicals:
+        parts.append(f"chemical: {chemicals}")
+    if organic:
+        parts.append(f"organic: {organic}")
+    return " | ".join(parts)
+
+
+def _row(rel_path: str, raw: dict[str, Any] | None, error: str | None) -> dict[str, Any]:
+    if raw is None:
+        return {"path": rel_path, "error": error}
+    treatment = get_treatment(raw["class_name"]) or {}
+    return {
+        "path":              rel_path,
+        "class_name":        raw["class_name"],
+        "plant":             treatment.get("plant"),
+        "condition":         treatment.get("condition"),
+        "is_healthy":        treatment.get("is_healthy"),
+        "confidence":        round(raw["confidence"], 4),
+        "severity_risk":     treatment.get("severity_risk"),
+        "treatment_summary": _treatment_summary(treatment) if treatment else None,
+        "top5":              json.dumps(raw.get("top5", [])),
+        "error":             None,
+    }
+
+
+# ── Scanner ───────────────────────────────────────────────────────────────────
+
+def scan_directory(
+    root: str,
+    output: str,
+    model_path: str,
+    workers: int | None = None,
+    batch_size: int = 32,
+) -> dict[str, Any]:
+    """Classify every image under ``root``; returns a run summary."""
+    root_dir = Path(root).resolve()
+    out_path = Path(output)
+    checkpoint_path = out_path.with_name(out_path.name + ".checkpoint")
+    workers = workers or os.cpu_count() or 1
+
+    done: set[str] = set()
+    if checkpoint_path.exists():
+        done = set(checkpoint_path.read_text(encoding="utf-8").splitlines())
+        logger.info("Resuming — %d images already in checkpoint %s", len(done), checkpoint_path)
+
+    todo = [
+        p for p in _walk_images(root_dir)
+        if p.relative_to(root_dir).as_posix() not in done
+    ]
+    logger.info("Bulk scan: %d images to process under %s (%d workers, batch %d)",
+                len(todo), root_dir, workers, batch_size)
+    if not todo:
+        return {"processed": 0, "failed": 0, "skipped": len(done), "seconds": 0.0}
+
+    # Pool first ("spawn", before TensorFlow is loaded) so no model state is forked.
+    pool = multiprocessing.get_context("spawn").Pool(processes=workers)
+    predictor = load_predictor(model_path, batching=False, workers=0)
+    tensor_path = hasattr(predictor, "predict_tensor")
+    size = getattr(predictor, "input_size", IMG_SIZE)
+    decode = functools.partial(_decode, size=(size[1], size[0]))
+
+    checkpoint = open(checkpoint_path, "a", encoding="utf-8")
+    sink = _open_sink(out_path, checkpoint)
+    buffer = np.empty((batch_size, *size, 3), dtype=np.float32)
+
+    processed = failed = 0
+    started = last_log = time.perf_counter()
+    window = batch_size * workers * 4   # bounds decoded-but-not-inferred images in memory
+
+    try:
+        for start in range(0, len(todo), window):
+            chunk = [str(p) for p in todo[start:start + window]]
+            decoded = pool.imap(decode, chunk, chunksize=max(1, batch_size // 4))
+
+            batch: list[tuple[str, np.ndarray | None, str | None]] = []
+            for item in decoded:
+                batch.append(item)
+                if len(batch) == batch_size:
+                    failed += _flush(batch, predictor, tensor_path, buffer, root_dir, sink)
+                    processed += len(batch)
+                    batch = []
+            if batch:
+                failed += _flush(batch, predictor, tensor_path, buffer, root_dir, sink)
+                processed += len(batch)
+
+            now = time.perf_counter()
+            if now - last_log >= 10 or start + window >= len(todo):
+                rate = processed / (now - started)
+                eta  = (len(todo) - processed) / rate if rate else 0.0
+                logger.info("Scanned %d / %d images | %.1f img/s | ETA %.0f s",
+                            processed, len(todo), rate, eta)
+                last_log = now
+    finally:
+        pool.terminate()
+        sink.close()
+        checkpoint.close()
+        if hasattr(predictor, "close"):
+            predictor.close()
+
+    seconds = time.perf_counter() - started
+    return {"processed": processed, "failed": failed, "skipped": len(done), "seconds": round(seconds, 2)}
+
+
+def _flush(
+    batch: list[tuple[str, np.ndarray | None, str | None]],
+    predictor,
+    tensor_path: bool,
+    buffer: np.ndarray,
+    root_dir: Path,
+    sink: _CsvSink | _ParquetSink,
+) -> int:
+    """Infer one batch and write its rows; only successes are checkpointed. Returns the failure count."""
+    ok = [i for i, (_, arr, _) in enumerate(batch) if arr is not None]
+    raws: dict[int, dict[str, Any]] = {}
+    errors: dict[int, str] = {i: err for i, (_, arr, err) in enumerate(batch) if arr is None}
+
+    if ok and tensor_path:
+        for slot, i in enumerate(ok):
+            np.multiply(batch[i][1], _SCALE, out=buffer[slot], casting="unsafe")
+        tensors = buffer[:len(ok)]
+        tensors -= 1.0
+        try:
+            probs = predictor.predict_tensor(tensors)
+            raws = {i: format_prediction(row) for i, row in zip(ok, probs)}
+        except Exception as exc:
+            errors.update({i: f"Inference failed: {exc}" for i in ok})
+    elif ok:
+        for i in ok:
+            raws[i] = predictor.predict(Path(batch[i][0]).read_bytes())
+
+    rel = [Path(path).relative_to(root_dir).as_posix() for path, _, _ in batch]
+    sink.write(
+        [_row(rel[i], raws.get(i), errors.get(i)) for i in range(len(batch))],
+        [rel[i] for i in range(len(batch)) if i not in errors],   # failures are retried on resume
+    )
+    return len(errors)
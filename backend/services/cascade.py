@@ -0,0 +1,138 @@
+"""
+Confidence Cascade
+==================
+Two-stage inference: a tiny low-resolution gate model (e.g. MobileNetV2
+alpha 0.35 at 128×128) classifies every image first, and only images whose
+gate top-1 confidence is below CASCADE_THRESHOLD are escalated to the full
+224×224 model. Most uploads are clear-cut, so most never pay for the big model.
+
+The cascade is itself a TensorPredictor over 224×224 batches, so it slots in
+under the micro-batcher, the shared-memory workers and the bulk scanner
+unchanged. The gate input is a PIL-equivalent bilinear downsample of the
+already preprocessed batch (preprocessing is linear, so this matches resizing
+the 224×224 image before preprocessing) — each image is still decoded once.
+
+Env vars:
+  GATE_MODEL_PATH     gate model file (.keras / .h5 / .tflite / .onnx); unset disables
+  CASCADE_THRESHOLD   gate confidence needed to skip the full model (default 0.9)
+
+``stats()`` reports the escalation rate and per-stage latency so the threshold
+can be tuned against the CPU budget.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Any, Iterable
+
+import numpy as np
+
+from services.batching import batch_buckets
+from services.predictor import TensorPredictor
+
+_LATENCY_WINDOW = 1024   # recent batches kept for the latency percentiles
+
+
+def _resize_matrix(src: int, dst: int) -> np.ndarray:
+    """(dst, src) weights of PIL's BILINEAR resize — a triangle filter widened when downscaling."""
+    scale  = src / dst
+    width  = max(scale, 1.0)
+    centre = (np.arange(dst) + 0.5) * scale
+    offset = np.arange(src) + 0.5
+    mat = np.clip(1.0 - np.abs(offset[None, :] - centre[:, None]) / width, 0.0, None)
+    return (mat / mat.sum(axis=1, keepdims=True)).astype(np.float32)
+
+
+class _StageTimer:
+    """Per-stage latency: running totals plus a bounded window for p95."""
+
+    def __init__(self) -> None:
+        self.images  = 0
+        self.seconds = 0.0
+        self.recent: deque[float] = deque(maxlen=_LATENCY_WINDOW)
+
+    def add(self, images: int, seconds: float) -> None:
+        self.images  += images
+        self.seconds += seconds
+        self.recent.append(seconds / images * 1000)
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            "images":            self.images,
+            "mean_ms_per_image": round(self.seconds / self.images * 1000, 3) if self.images else 0.0,
+            "p95_ms_per_image":  round(float(np.percentile(self.recent, 95)), 3) if self.recent else 0.0,
+        }
+
+
+class CascadePredictor(TensorPredictor):
+    """Gate model first; the full model only for low-confidence images."""
+
+    def __init__(self, gate: TensorPredictor, full: TensorPredictor, threshold: float):
+        self.gate        = gate
+        self.full        = full
+        self.threshold   = threshold
+        self.input_size  = full.input_size
+        self.pad_batches = gate.pad_batches or full.pad_batches
+
+        (h, w), (gh, gw) = full.input_size, gate.input_size
+        self._rows = _resize_matrix(h, gh)
+        self._cols = _resize_matrix(w, gw)
+
+        self._lock        = threading.Lock()
+        self._requests    = 0
+        self._escalations = 0
+        self._gate_timer  = _StageTimer()
+        self._full_timer  = _StageTimer()
+
+    def predict_tensor(self, batch: np.ndarray) -> np.ndarray:
+        started = time.perf_counter()
+        small   = np.einsum("ah,nhwc,bw->nabc", self._rows, batch, self._cols, optimize=True)
+        probs   = np.array(self.gate.predict_tensor(small), dtype=np.float32, copy=True)
+        gate_s  = time.perf_counter() - started
+
+        escalate = np.flatnonzero(probs.max(axis=1) < self.threshold)
+        full_s   = 0.0
+        if escalate.size:
+            started = time.perf_counter()
+            probs[escalate] = self._run_full(batch[escalate], len(batch))
+            full_s = time.perf_counter() - started
+
+        with self._lock:
+            self._requests    += len(batch)
+            self._escalations += escalate.size
+            self._gate_timer.add(len(batch), gate_s)
+            if escalate.size:
+                self._full_timer.add(escalate.size, full_s)
+        return probs
+
+    def _run_full(self, subset: np.ndarray, batch_size: int) -> np.ndarray:
+        """
+        Full-model pass. When the full model needs fixed shapes, pad to the
+        smallest warmed-up bucket (those of the incoming ``batch_size``).
+        """
+        n = len(subset)
+        if not self.full.pad_batches:
+            return self.full.predict_tensor(subset)
+        size   = next(b for b in batch_buckets(batch_size) if b >= n)
+        padded = np.zeros((size, *subset.shape[1:]), dtype=np.float32)
+        padded[:n] = subset
+        return self.full.predict_tensor(padded)[:n]
+
+    def warmup(self, batch_sizes: Iterable[int] = (1,)) -> None:
+        sizes = list(batch_sizes)
+        self.gate.warmup(sizes)
+        self.full.warmup(sizes)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "threshold":       self.threshold,
+                "gate_input_size": list(self.gate.input_size),
+                "images":          self._requests,
+                "escalations":     self._escalations,
+                "escalation_rate": round(self._escalations / self._requests, 4) if self._requests else 0.0,
+                "gate":            self._gate_timer.summary(),
+                "full":            self._full_timer.summary(),
+            }
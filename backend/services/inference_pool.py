@@ -0,0 +1,241 @@
+"""
+Inference Executor
+==================
+Keeps image decoding and model inference off the asyncio event loop so that
+/health, /api/history and chat requests stay responsive while scans run.
+
+Two executor kinds (INFERENCE_EXECUTOR env var):
+  - "thread"  (default) — one predictor shared by a thread pool. TensorFlow and
+                          PIL release the GIL for the heavy lifting, and the
+                          micro-batcher (services.batching) coalesces requests.
+  - "process"           — every worker process loads its own predictor, so
+                          Python-side work scales across all cores.
+
+INFERENCE_WORKERS sets the pool size (default: number of CPU cores).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import time
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any
+
+import numpy as np
+
+from services.batching import record_future_timing
+from services.metrics import observe_batch, record_stage
+from services.predictor import IMG_SIZE, format_prediction, load_predictor, preprocess_into
+from services.shm_workers import SHM_WORKERS
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_EXECUTOR = os.environ.get("INFERENCE_EXECUTOR", "thread").lower()
+INFERENCE_WORKERS  = int(os.environ.get("INFERENCE_WORKERS", "0")) or (os.cpu_count() or 1)
+BATCH_CHUNK_SIZE   = int(os.environ.get("BATCH_CHUNK_SIZE", "32"))   # /api/predict/batch model batch
+
+
+# ── Process-pool worker side ──────────────────────────────────────────────────
+
+_worker_predictor = None   # one predictor per worker process
+_worker_barrier   = None   # startup rendezvous shared by every worker
+
+
+def _init_worker(model_path: str, barrier) -> None:
+    global _worker_predictor, _worker_barrier
+    _worker_barrier = barrier
+    # A worker only ever serves one request at a time — batching would just add wait.
+    _worker_predictor = load_predictor(model_path, batching=False)
+    if hasattr(_worker_predictor, "warmup"):
+        _worker_predictor.warmup()
+
+
+def _worker_predict(image_bytes: bytes) -> dict[str, Any]:
+    return _worker_predictor.predict(image_bytes)
+
+
+def _worker_predict_array(frame: np.ndarray, bgr: bool) -> dict[str, Any]:
+    return _worker_predictor.predict_array(frame, bgr)
+
+
+def _worker_model_loaded() -> bool:
+    return getattr(_worker_predictor, "model_loaded", False)
+
+
+def _worker_ready() -> bool:
+    # Held until every worker has arrived, so N submissions occupy N distinct processes.
+    _worker_barrier.wait()
+    return _worker_model_loaded()
+
+
+# ── Pool ──────────────────────────────────────────────────────────────────────
+
+class InferencePool:
+    """
+    Awaitable front-end to a predictor. ``predict_async`` is what route
+    handlers call; ``predict`` remains available for synchronous callers.
+    """
+
+    retired = False   # set by ModelManager once a newer pool has replaced this one
+
+    def __init__(self, model_path: str, kind: str = "thread", workers: int = 1):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown INFERENCE_EXECUTOR '{kind}' (expected 'thread' or 'process').")
+
+        self.kind    = kind
+        self.workers = max(1, workers)
+        self._executor: Executor
+
+        if kind == "process":
+            if SHM_WORKERS > 0:
+                # Every pool worker would start its own set of shared-memory workers.
+                raise ValueError("SHM_WORKERS cannot be combined with INFERENCE_EXECUTOR=process — pick one.")
+            # "spawn" keeps TensorFlow state from leaking into forked children.
+            ctx = multiprocessing.get_context("spawn")
+            self.predictor = None
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=ctx,
+                initializer=_init_worker,
+                initargs=(model_path, ctx.Barrier(self.workers)),
+            )
+            # Spawned workers start on demand; make all of them load and warm up
+            # now rather than on the first requests that happen to need them.
+            ready = [self._executor.submit(_worker_ready) for _ in range(self.workers)]
+            self.model_loaded = all(future.result() for future in ready)
+        else:
+            self.predictor = load_predictor(model_path)
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="inference",
+            )
+            self.model_loaded = getattr(self.predictor, "model_loaded", False)
+
+        logger.info("Inference executor: %s pool with %d worker(s).", self.kind, self.workers)
+
+    async def predict_async(self, image_bytes: bytes) -> dict[str, Any]:
+        loop = asyncio.get_running_loop()
+
+        if self.kind == "process":
+            started = time.perf_counter()
+            raw = await loop.run_in_executor(self._executor, _worker_predict, image_bytes)
+            record_stage("inference", time.perf_counter() - started)   # decode included
+            return raw
+
+        # Copied context: decode / inference timings reach the calling request.
+        run = contextvars.copy_context().run
+        if hasattr(self.predictor, "submit"):
+            # Micro-batched: decode on the pool, then await the batch without holding a thread.
+            future = await loop.run_in_executor(self._executor, run, self.predictor.submit, image_bytes)
+            probs  = await asyncio.wrap_future(future)
+            record_future_timing(future)
+            return format_prediction(probs)
+
+        return await loop.run_in_executor(self._executor, run, self.predictor.predict, image_bytes)
+
+    async def predict_array_async(self, frame: np.ndarray, bgr: bool = True) -> dict[str, Any]:
+        """``predict_async`` for an already-decoded uint8 (H, W, 3) image."""
+        loop = asyncio.get_running_loop()
+
+        if self.kind == "process":
+            started = time.perf_counter()
+            raw = await loop.run_in_executor(self._executor, _worker_predict_array, frame, bgr)
+            record_stage("inference", time.perf_counter() - started)   # resize included
+            return raw
+
+        run = contextvars.copy_context().run
+        if hasattr(self.predictor, "submit_array"):
+            future = await loop.run_in_executor(self._executor, run, self.predictor.submit_array, frame, bgr)
+            probs  = await asyncio.wrap_future(future)
+            record_future_timing(future)
+            return format_prediction(probs)
+
+        return await loop.run_in_executor(self._executor, run, self.predictor.predict_array, frame, bgr)
+
+    async def predict_many_async(self, images: list[bytes]) -> list[dict[str, Any] | Exception]:
+        """
+        Predict a whole upload at once. Images are decoded in parallel on the
+        executor and reach the model in batches; a failing image yields its
+        exception in place instead of failing the rest.
+        """
+        if self.kind == "thread" and hasattr(self.predictor, "predict_tensor"):
+            return await self._predict_chunked(images)
+        # Micro-batcher / shared-memory workers batch concurrent calls by themselves.
+        return await asyncio.gather(
+            *(self.predict_async(image) for image in images), return_exceptions=True,
+        )
+
+    async def _predict_chunked(self, images: list[bytes]) -> list[dict[str, Any] | Exception]:
+        """Unbatched in-process model: preprocess in parallel, then run fixed-size chunks."""
+        loop    = asyncio.get_running_loop()
+        results: list[dict[str, Any] | Exception] = [None] * len(images)  # type: ignore[list-item]
+        buffer  = np.empty((min(len(images), BATCH_CHUNK_SIZE), *self.input_size, 3), dtype=np.float32)
+
+        for start in range(0, len(images), BATCH_CHUNK_SIZE):
+            chunk = images[start:start + BATCH_CHUNK_SIZE]
+            decoded = await asyncio.gather(
+                *(loop.run_in_executor(self._executor, preprocess_into, image, buffer[i])
+                  for i, image in enumerate(chunk)),
+                return_exceptions=True,
+            )
+            ok = [i for i, d in enumerate(decoded) if not isinstance(d, Exception)]
+            for i, d in enumerate(decoded):
+                if isinstance(d, Exception):
+                    results[start + i] = d
+            if not ok:
+                continue
+            batch = buffer[:len(chunk)] if len(ok) == len(chunk) else buffer[ok]
+            try:
+                started = time.perf_counter()
+                probs = await loop.run_in_executor(
+                    self._executor, self.predictor.predict_tensor, batch,
+                )
+                observe_batch(len(batch), time.perf_counter() - started)
+            except Exception as exc:
+                for i in ok:
+                    results[start + i] = exc
+                continue
+            for i, row in zip(ok, probs):
+                results[start + i] = format_prediction(row)
+        return results
+
+    @property
+    def input_size(self) -> tuple[int, int]:
+        """Model input (H, W); process workers' models aren't visible here, so IMG_SIZE."""
+        return getattr(self.predictor, "input_size", IMG_SIZE)
+
+    def warmup(self) -> None:
+        """
+        Trace / compile the model before traffic arrives. Process workers warm
+        themselves up in their initializer, so only the thread kind acts here.
+        """
+        if hasattr(self.predictor, "warmup"):
+            self.predictor.warmup()
+
+    def predict(self, image_bytes: bytes) -> dict[str, Any]:
+        if self.kind == "process":
+            return self._executor.submit(_worker_predict, image_bytes).result()
+        return self.predictor.predict(image_bytes)
+
+    def stats(self) -> dict[str, Any]:
+        """Executor settings plus whatever the wrapped predictor reports."""
+        inner = self.predictor.stats() if hasattr(self.predictor, "stats") else {}
+        return {
+            "executor":  self.kind,
+            "workers":   self.workers,
+            "predictor": type(self.predictor).__name__ if self.predictor is not None else "per-process",
+            **inner,
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        if hasattr(self.predictor, "close"):
+            self.predictor.close()
+
+
+def create_inference_pool(model_path: str) -> InferencePool:
+    """Build the pool configured by INFERENCE_EXECUTOR / INFERENCE_WORKERS."""
+    return InferencePool(model_path, kind=INFERENCE_EXECUTOR, workers=INFERENCE_WORKERS)
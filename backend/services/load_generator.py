@@ -0,0 +1,303 @@
+"""
+HTTP Load Generator
+===================
+Drives the API with concurrent keep-alive clients and reports throughput plus
+p50 / p95 / p99 latency per endpoint as JSON, for capacity planning.
+
+Targets either a running server (``--loadtest http://host:8000``) or, with no
+URL, the app itself started in-process on a free localhost port — so it runs
+fully offline against MockPredictor, ``MODEL_PATH=synthetic`` or a local model.
+Requests go through real HTTP either way (uvicorn, multipart parsing, JSON).
+
+Traffic mix (``--mix``, relative weights):
+  predict    POST /api/predict               — images from ``--corpus`` (or generated JPEGs)
+  recommend  POST /api/fertilizers/recommend — random NPK readings
+  history    GET  /api/history
+
+Prediction requests send ``Cache-Control: no-cache`` so the model path is
+measured; pass ``--cache`` to let the prediction cache / near-duplicate index
+answer repeats, as they would for real traffic.
+
+Usage:
+  python main.py --loadtest
+  python main.py --loadtest http://10.0.0.5:8000 --concurrency 64 --duration 60
+  python main.py --loadtest --corpus samples/ --mix predict=1 --report load.json
+"""
+
+from __future__ import annotations
+
+import http.client
+import io
+import json
+import logging
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any
+from urllib.parse import urlsplit
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+IMAGE_MIME = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png",
+              ".webp": "image/webp", ".bmp": "image/bmp"}
+
+DEFAULT_MIX = "predict=8,recommend=1,history=1"
+CROPS = ["tomato", "potato", "corn", "apple", "grape", "pepper", "rice", "wheat"]
+
+
+# ── Request payloads ──────────────────────────────────────────────────────────
+
+def _generated_corpus(count: int = 32, seed: int = 0) -> list[tuple[str, bytes, str]]:
+    """Leaf-ish JPEGs at typical phone-upload sizes, for runs without ``--corpus``."""
+    rng   = np.random.default_rng(seed)
+    sizes = [(640, 480), (1280, 960), (2016, 1512), (4032, 3024)]
+    corpus = []
+    for i in range(count):
+        w, h  = sizes[i % len(sizes)]
+        small = rng.integers(0, 255, size=(h // 32, w // 32, 3), dtype=np.uint8)
+        small[..., 1] = np.maximum(small[..., 1], 120)   # mostly green
+        img = Image.fromarray(small).resize((w, h), Image.BILINEAR)
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=85)
+        corpus.append((f"generated_{i:03d}.jpg", buf.getvalue(), "image/jpeg"))
+    return corpus
+
+
+def _load_corpus(directory: str) -> list[tuple[str, bytes, str]]:
+    files = sorted(
+        p for p in Path(directory).rglob("*")
+        if p.suffix.lower() in IMAGE_EXTENSIONS and not p.name.startswith(".")
+    )
+    if not files:
+        raise SystemExit(f"❌  No images found under {directory}")
+    return [(p.name, p.read_bytes(), IMAGE_MIME[p.suffix.lower()]) for p in files]
+
+
+def _multipart(filename: str, payload: bytes, mime: str) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {mime}\r\n\r\n"
+    ).encode()
+    return head + payload + f"\r\n--{boundary}--\r\n".encode(), f"multipart/form-data; boundary={boundary}"
+
+
+def _parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("predict", "recommend", "history"):
+            raise SystemExit(f"❌  Unknown endpoint '{name}' in --mix (predict, recommend, history)")
+        weights[name] = float(weight or 1)
+    return {name: w for name, w in weights.items() if w > 0}
+
+
+# ── In-process server ─────────────────────────────────────────────────────────
+
+class _LocalServer:
+    """Runs ``app`` under uvicorn on a free 127.0.0.1 port in a background thread."""
+
+    def __init__(self, app):
+        import uvicorn
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, name="loadtest-server", daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        deadline = time.monotonic() + 300   # includes model load + warm-up
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise SystemExit("❌  In-process server failed to start")
+            time.sleep(0.05)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+# ── Client workers ────────────────────────────────────────────────────────────
+
+class _Client(threading.Thread):
+    """One keep-alive connection issuing requests back to back."""
+
+    def __init__(self, index: int, base_url: str, plan: "_Plan"):
+        super().__init__(name=f"loadtest-client-{index}", daemon=True)
+        parts = urlsplit(base_url)
+        self._conn_args = (parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        self._https = parts.scheme == "https"
+        self._prefix = parts.path.rstrip("/")
+        self._rng  = random.Random(index)
+        self._plan = plan
+        self.samples: list[tuple[str, float, int, str | None]] = []   # (endpoint, seconds, status, x-cache)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        return cls(*self._conn_args, timeout=self._plan.timeout)
+
+    def run(self) -> None:
+        conn = self._connect()
+        plan = self._plan
+        while plan.take():
+            endpoint = self._rng.choices(plan.endpoints, plan.weights)[0]
+            method, path, body, headers = plan.build(endpoint, self._rng)
+            started = time.perf_counter()
+            try:
+                conn.request(method, self._prefix + path, body=body, headers=headers)
+                resp = conn.getresponse()
+                resp.read()
+                status, cache = resp.status, resp.getheader("X-Cache")
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = self._connect()
+                status, cache = 0, None   # 0 = connection error / timeout
+            self.samples.append((endpoint, time.perf_counter() - started, status, cache))
+        conn.close()
+
+
+class _Plan:
+    """Shared stop condition (deadline and/or request budget) plus request builders."""
+
+    def __init__(self, mix: dict[str, float], corpus, duration: float, total: int | None,
+                 use_cache: bool, timeout: float):
+        self.endpoints = list(mix)
+        self.weights   = list(mix.values())
+        self.corpus    = corpus
+        self.deadline  = time.perf_counter() + duration if duration else None
+        self.remaining = total
+        self.use_cache = use_cache
+        self.timeout   = timeout
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            return False
+        if self.remaining is None:
+            return True
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+    def build(self, endpoint: str, rng: random.Random) -> tuple[str, str, bytes | None, dict[str, str]]:
+        if endpoint == "predict":
+            body, content_type = _multipart(*rng.choice(self.corpus))
+            headers = {"Content-Type": content_type}
+            if not self.use_cache:
+                headers["Cache-Control"] = "no-cache"
+            return "POST", "/api/predict", body, headers
+        if endpoint == "recommend":
+            payload = {
+                "nitrogen":    round(rng.uniform(0, 100), 1),
+                "phosphorus":  round(rng.uniform(0, 100), 1),
+                "potassium":   round(rng.uniform(0, 100), 1),
+                "crop":        rng.choice(CROPS),
+                "temperature": round(rng.uniform(10, 38), 1),
+                "humidity":    round(rng.uniform(20, 95), 1),
+            }
+            return "POST", "/api/fertilizers/recommend", json.dumps(payload).encode(), \
+                {"Content-Type": "application/json"}
+        return "GET", "/api/history", None, {}
+
+
+# ── Report ────────────────────────────────────────────────────────────────────
+
+def _summarise(samples: list[tuple[str, float, int, str | None]], elapsed: float) -> dict[str, Any]:
+    def block(rows) -> dict[str, Any]:
+        ok = np.array([s for _, s, status, _ in rows if 200 <= status < 400]) * 1000
+        statuses = Counter(str(status) for _, _, status, _ in rows)
+        out: dict[str, Any] = {
+            "requests":       len(rows),
+            "errors":         len(rows) - len(ok),
+            "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+            "status_counts":  dict(sorted(statuses.items())),
+        }
+        if len(ok):
+            p50, p95, p99 = np.percentile(ok, [50, 95, 99])
+            out["latency_ms"] = {
+                "mean": round(float(ok.mean()), 2), "p50": round(float(p50), 2),
+                "p95": round(float(p95), 2), "p99": round(float(p99), 2), "max": round(float(ok.max()), 2),
+            }
+        return out
+
+    by_endpoint: dict[str, list] = {}
+    for row in samples:
+        by_endpoint.setdefault(row[0], []).append(row)
+    report = {"overall": block(samples), "endpoints": {name: block(rows) for name, rows in sorted(by_endpoint.items())}}
+    cache = Counter(c for name, _, _, c in samples if name == "predict" and c)
+    if cache:
+        report["endpoints"]["predict"]["x_cache"] = dict(cache)
+    return report
+
+
+# ── Entry point ───────────────────────────────────────────────────────────────
+
+def run_load_test(
+    app=None,
+    url: str | None = None,
+    concurrency: int = 16,
+    duration: float = 30.0,
+    requests: int | None = None,
+    corpus: str | None = None,
+    mix: str = DEFAULT_MIX,
+    use_cache: bool = False,
+    timeout: float = 60.0,
+) -> dict[str, Any]:
+    """
+    Load-test ``url`` (or ``app`` served in-process when ``url`` is None).
+    Stops after ``duration`` seconds or ``requests`` requests, whichever comes first
+    (``duration=0`` → request budget only). Returns the JSON-ready report.
+    """
+    weights = _parse_mix(mix)
+    images  = _load_corpus(corpus) if corpus else _generated_corpus()
+    if url is None and app is None:
+        raise ValueError("run_load_test needs either a URL or an app to serve in-process")
+    if not duration and not requests:
+        raise ValueError("run_load_test needs a duration or a request budget")
+
+    limits = [f"{duration:g} s"] if duration else []
+    limits += [f"{requests} requests"] if requests else []
+
+    def drive(base_url: str) -> dict[str, Any]:
+        logger.info("Load test: %s | %d clients | %s | mix %s | %d corpus images",
+                    base_url, concurrency, " / ".join(limits), mix, len(images))
+        plan    = _Plan(weights, images, duration, requests, use_cache, timeout)
+        clients = [_Client(i, base_url, plan) for i in range(concurrency)]
+        started = time.perf_counter()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.perf_counter() - started
+
+        samples = [row for client in clients for row in client.samples]
+        return {
+            "target":      base_url if url else "in-process",
+            "concurrency": concurrency,
+            "elapsed_s":   round(elapsed, 2),
+            "mix":         weights,
+            "corpus":      corpus or f"generated ({len(images)} JPEGs)",
+            "prediction_cache": use_cache,
+            **_summarise(samples, elapsed),
+        }
+
+    if url is not None:
+        return drive(url)
+    with _LocalServer(app) as base_url:
+        return drive(base_url)
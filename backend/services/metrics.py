@@ -0,0 +1,336 @@
+"""
+Prometheus Metrics
+==================
+A small, dependency-free metrics registry rendered in the Prometheus text
+exposition format (0.0.4) at GET /metrics.
+
+Instrumentation is cheap enough to leave on in production: an observation is
+a ``bisect`` into fixed buckets plus a few additions under a per-metric lock,
+and nothing is computed until /metrics is scraped. Label sets are bounded —
+routes are labelled by their template (``/api/predict``), never the raw path.
+
+Exported series:
+  http_requests_total{method,route,status}             counter
+  http_request_duration_seconds{method,route}          histogram
+  predict_stage_duration_seconds{stage}                histogram — read, cache, preprocess,
+                                                       queue, inference, lookup, build
+  inference_batch_size                                 histogram — images per model call
+  inference_batch_duration_seconds                     histogram — one model call
+  predictor_info{predictor,model_version}              gauge (always 1)
+  history_entries / chat_history_messages              gauges
+  prediction_cache_entries / near_duplicate_entries    gauges
+
+Per-request stage timings are collected in a StageTimings object carried by a
+context variable, so code deep in the predictor (decode on an executor thread,
+micro-batched inference) can attribute its time to the request that caused it.
+Routers built with ``route_class=ServerTimingRoute`` return those timings in a
+``Server-Timing`` header (read, preprocess, inference, lookup, llm, …, total),
+which browser devtools and the mobile client can display directly.
+"""
+
+from __future__ import annotations
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from fastapi import HTTPException, Request
+from fastapi.routing import APIRoute
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_BUCKETS   = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def _fmt(value: float) -> str:
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r'\"').replace("\n", r"\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], le: str | None = None) -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+REGISTRY: list["_Metric"] = []
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text format."""
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# ── Metric types ──────────────────────────────────────────────────────────────
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name       = name
+        self.doc        = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock      = threading.Lock()
+        REGISTRY.append(self)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[tuple[str, ...], list] = {}   # labels → [bucket counts..., +Inf, sum]
+
+    def observe(self, value: float, *labels: str) -> None:
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[idx] += 1
+            series[-1]  += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = self.header()
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), series[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, _fmt(bound))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Sampled at scrape time from ``fn() -> {label values: value}`` callbacks."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._fn: Callable[[], dict[tuple[str, ...], float]] | None = None
+
+    def set_function(self, fn: Callable[[], dict[tuple[str, ...], float]]) -> None:
+        self._fn = fn
+
+    def render(self) -> list[str]:
+        if self._fn is None:
+            return []
+        try:
+            values = self._fn()
+        except Exception:
+            return []   # a broken callback must never break the scrape
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in values.items()]
+
+
+# ── Application metrics ───────────────────────────────────────────────────────
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status"))
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency incl. streamed bodies.", ("method", "route"))
+PREDICT_STAGES = Histogram(
+    "predict_stage_duration_seconds", "Time per stage of a /api/predict request.", ("stage",))
+BATCH_SIZE = Histogram(
+    "inference_batch_size", "Images per model forward pass.", buckets=BATCH_BUCKETS)
+BATCH_DURATION = Histogram(
+    "inference_batch_duration_seconds", "Duration of one model forward pass.")
+PREDICTOR_INFO = Gauge(
+    "predictor_info", "Serving predictor type and model version (value is always 1).",
+    ("predictor", "model_version"))
+HISTORY_ENTRIES   = Gauge("history_entries", "Scan records held in memory.")
+CHAT_MESSAGES     = Gauge("chat_history_messages", "Chat messages held in memory.")
+CACHE_ENTRIES     = Gauge("prediction_cache_entries", "Entries in the exact-bytes prediction cache.")
+NEAR_DUP_ENTRIES  = Gauge("near_duplicate_entries", "Entries in the perceptual-hash index.")
+
+
+def observe_batch(size: int, seconds: float) -> None:
+    BATCH_SIZE.observe(size)
+    BATCH_DURATION.observe(seconds)
+
+
+def bind_app_state(state: Any) -> None:
+    """Register the scrape-time gauges that read from ``app.state``."""
+    def predictor_info() -> dict[tuple[str, ...], float]:
+        # InferencePool → BatchingPredictor → KerasPredictor reads "BatchingPredictor/KerasPredictor"
+        names, inner = [], getattr(state.predictor, "predictor", None)
+        while inner is not None and len(names) < 4:
+            names.append(type(inner).__name__)
+            inner = getattr(inner, "predictor", None)
+        name    = "/".join(names) or "process-workers"
+        version = getattr(getattr(state, "models", None), "version", None) or "-"
+        return {(name, version): 1}
+
+    PREDICTOR_INFO.set_function(predictor_info)
+    HISTORY_ENTRIES.set_function(lambda: {(): len(state.history)})
+    CHAT_MESSAGES.set_function(lambda: {(): len(getattr(state, "chat_history", []))})
+    CACHE_ENTRIES.set_function(lambda: {(): state.prediction_cache.stats()["entries"]})
+    NEAR_DUP_ENTRIES.set_function(lambda: {(): state.near_duplicates.stats()["entries"]})
+
+
+# ── Per-request stage timings ─────────────────────────────────────────────────
+
+class StageTimings:
+    """Accumulates named stage durations (seconds) for one request."""
+
+    __slots__ = ("stages",)
+
+    def __init__(self) -> None:
+        self.stages: dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def observe(self, histogram: Histogram = PREDICT_STAGES) -> None:
+        for name, seconds in self.stages.items():
+            histogram.observe(seconds, name)
+
+    def server_timing(self, total_s: float) -> str:
+        """``Server-Timing`` header value, durations in milliseconds."""
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={total_s * 1000:.2f}")
+        return ", ".join(entries)
+
+
+current_timings: contextvars.ContextVar[StageTimings | None] = contextvars.ContextVar(
+    "current_timings", default=None)
+
+
+@contextmanager
+def track_stages(histogram: Histogram | None = PREDICT_STAGES) -> Iterator[StageTimings]:
+    """Time one request's stages; they are observed into ``histogram`` (if any) on exit."""
+    timings = StageTimings()
+    token   = current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        current_timings.reset(token)
+        if histogram is not None:
+            timings.observe(histogram)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Attribute ``seconds`` to ``stage`` of the current request, if one is being timed."""
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def timed_stage(stage: str) -> Iterator[None]:
+    """``with timed_stage("lookup"): …`` — record_stage for a block."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def _timing_headers(timings: StageTimings, started: float) -> dict[str, str]:
+    return {
+        "Server-Timing":      timings.server_timing(time.perf_counter() - started),
+        "Timing-Allow-Origin": "*",   # lets cross-origin pages read it via PerformanceServerTiming
+    }
+
+
+class ServerTimingRoute(APIRoute):
+    """
+    Times each request's stages and returns them in a ``Server-Timing`` header —
+    on error responses too. "read" covers receiving and parsing the request body.
+    Stages of the routes in ``stage_histograms`` also feed that Prometheus histogram.
+    """
+
+    stage_histograms: dict[str, Histogram] = {"/api/predict": PREDICT_STAGES}
+
+    def get_route_handler(self) -> Callable:
+        handler   = super().get_route_handler()
+        histogram = self.stage_histograms.get(self.path)
+
+        async def timed_handler(request: Request):
+            started = time.perf_counter()
+            with track_stages(histogram) as timings:
+                if request.method in ("POST", "PUT", "PATCH"):
+                    with timings.stage("read"):   # FastAPI reuses the parsed / cached body
+                        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+                            await request.form()
+                        else:
+                            await request.body()
+                try:
+                    response = await handler(request)
+                except HTTPException as exc:
+                    exc.headers = {**(exc.headers or {}), **_timing_headers(timings, started)}
+                    raise
+            response.headers.update(_timing_headers(timings, started))
+            return response
+
+        return timed_handler
+
+
+# ── ASGI middleware ───────────────────────────────────────────────────────────
+
+class MetricsMiddleware:
+    """Counts and times every HTTP request, labelled by matched route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status  = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route  = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            HTTP_REQUESTS.inc(method, route, str(status))
+            HTTP_DURATION.observe(time.perf_counter() - started, method, route)
@@ -0,0 +1,244 @@
+"""
+Micro-Benchmark Suite
+=====================
+Times the request hot-path pieces in isolation and compares them against a
+saved JSON baseline, so slowdowns are caught before deploying.
+
+Benchmarks:
+  preprocess/<format>/<WxH>     preprocess_image on JPEG / PNG / WebP uploads of several sizes
+  preprocess/frame/640x480      preprocess_array on a raw BGR webcam frame (no JPEG round-trip)
+  model/predict                 predictor.predict on one encoded image
+  model/batch_<n>               predictor.predict_tensor at batch sizes 1 … 64
+  treatment/get_treatment       treatment database lookup
+  fertilizer/recommend          recommend_fertilizer
+  schema/prediction_result      PredictionResult construction + JSON serialization
+  schema/npk_response           NPKResponse construction + JSON serialization
+
+The model benchmarks use MODEL_PATH (batch sizes are skipped for MockPredictor,
+which has no tensor path). Each benchmark auto-sizes its loop to ~0.2 s, runs
+several repeats and reports the median per-call time.
+
+Usage:
+  python main.py --bench --save bench_baseline.json
+  python main.py --bench --baseline bench_baseline.json [--threshold 0.15] [--only preprocess]
+
+With ``--baseline`` the process exits non-zero if any benchmark's median is
+more than ``threshold`` (fractional, default 15 %) slower than the baseline.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import logging
+import platform
+import statistics
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+from PIL import Image
+
+from models.schemas import NPKRecommendation, NPKResponse
+from routers.predict import _build_result
+from services.fertilizer_service import recommend_fertilizer
+from services.predictor import load_predictor, preprocess_array, preprocess_image
+from services.treatment_db import get_treatment
+
+logger = logging.getLogger(__name__)
+
+IMAGE_SIZES   = [(320, 240), (1280, 960), (4032, 3024)]
+IMAGE_FORMATS = {"jpeg": {"quality": 90}, "png": {}, "webp": {"quality": 85}}
+BATCH_SIZES   = [1, 2, 4, 8, 16, 32, 64]
+
+_TARGET_S = 0.2   # wall time per repeat
+_REPEATS  = 5
+
+
+def _time(fn: Callable[[], Any]) -> dict[str, Any]:
+    """Median / min per-call time over ``_REPEATS`` loops of an auto-sized iteration count."""
+    fn()   # warm caches / lazy init outside the measurement
+    number, elapsed = 1, 0.0
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= _TARGET_S / 4 or number >= 1 << 20:
+            break
+        number *= 4
+    number = max(1, int(number * _TARGET_S / max(elapsed, 1e-9)))
+
+    per_call = []
+    for _ in range(_REPEATS):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        per_call.append((time.perf_counter() - started) / number)
+
+    median = statistics.median(per_call)
+    return {
+        "median_us":  round(median * 1e6, 3),
+        "min_us":     round(min(per_call) * 1e6, 3),
+        "ops_per_s":  round(1 / median, 1) if median else 0.0,
+        "iterations": number * _REPEATS,
+    }
+
+
+def _encode(size: tuple[int, int], fmt: str, options: dict[str, Any]) -> bytes:
+    rng   = np.random.default_rng(size[0])
+    small = rng.integers(0, 255, size=(max(size[1] // 16, 1), max(size[0] // 16, 1), 3), dtype=np.uint8)
+    buf   = io.BytesIO()
+    Image.fromarray(small).resize(size, Image.BILINEAR).save(buf, fmt.upper(), **options)
+    return buf.getvalue()
+
+
+# ── Benchmark groups ──────────────────────────────────────────────────────────
+
+def _bench_preprocess() -> dict[str, Callable[[], Any]]:
+    cases = {}
+    for fmt, options in IMAGE_FORMATS.items():
+        for size in IMAGE_SIZES:
+            payload = _encode(size, fmt, options)
+            cases[f"preprocess/{fmt}/{size[0]}x{size[1]}"] = lambda p=payload: preprocess_image(p)
+    frame = np.asarray(Image.open(io.BytesIO(_encode((640, 480), "jpeg", IMAGE_FORMATS["jpeg"]))))[..., ::-1].copy()
+    cases["preprocess/frame/640x480"] = lambda: preprocess_array(frame)
+    return cases
+
+
+def _bench_model(model_path: str) -> tuple[dict[str, Callable[[], Any]], Callable[[], None]]:
+    predictor = load_predictor(model_path, batching=False, workers=0)
+    payload   = _encode((1280, 960), "jpeg", IMAGE_FORMATS["jpeg"])
+    cases: dict[str, Callable[[], Any]] = {"model/predict": lambda: predictor.predict(payload)}
+
+    if hasattr(predictor, "predict_tensor"):
+        if hasattr(predictor, "warmup"):
+            predictor.warmup(BATCH_SIZES)
+        rng = np.random.default_rng(0)
+        for n in BATCH_SIZES:
+            batch = rng.uniform(-1, 1, size=(n, *predictor.input_size, 3)).astype(np.float32)
+            cases[f"model/batch_{n}"] = lambda b=batch: predictor.predict_tensor(b)
+    else:
+        logger.info("Benchmark: %s has no tensor path — skipping batch-size benchmarks.",
+                    type(predictor).__name__)
+
+    close = getattr(predictor, "close", lambda: None)
+    return cases, close
+
+
+def _bench_lookups() -> dict[str, Callable[[], Any]]:
+    npk = {"nitrogen": 22.0, "phosphorus": 61.5, "potassium": 8.0, "crop": "Tomato",
+           "temperature": 31.0, "humidity": 78.0, "rainfall": 900.0}
+    return {
+        "treatment/get_treatment": lambda: get_treatment("Tomato___Late_blight"),
+        "fertilizer/recommend":    lambda: recommend_fertilizer(**npk),
+    }
+
+
+def _bench_schemas() -> dict[str, Callable[[], Any]]:
+    raw = {
+        "class_name": "Tomato___Late_blight",
+        "confidence": 0.9412,
+        "top5": [{"class": "Tomato___Late_blight", "confidence": 0.9412},
+                 {"class": "Potato___Late_blight", "confidence": 0.0321},
+                 {"class": "Tomato___Early_blight", "confidence": 0.0122},
+                 {"class": "Tomato___Leaf_Mold", "confidence": 0.0071},
+                 {"class": "Tomato___healthy", "confidence": 0.0030}],
+    }
+    recommendation = recommend_fertilizer(22.0, 61.5, 8.0, "Tomato", 31.0, 78.0, 900.0)
+
+    def npk_response() -> str:
+        return NPKResponse(
+            success=True, data=NPKRecommendation(**recommendation), message="benchmark",
+        ).model_dump_json()
+
+    return {
+        "schema/prediction_result": lambda: _build_result(raw).model_dump_json(),
+        "schema/npk_response":      npk_response,
+    }
+
+
+# ── Runner / baseline comparison ──────────────────────────────────────────────
+
+def run_benchmarks(model_path: str, only: str | None = None) -> dict[str, Any]:
+    """Run every benchmark whose name starts with ``only`` (all when None)."""
+    cases: dict[str, Callable[[], Any]] = {}
+    cases.update(_bench_preprocess())
+    cases.update(_bench_lookups())
+    cases.update(_bench_schemas())
+    close: Callable[[], None] = lambda: None
+    if not only or only.startswith("model") or "model".startswith(only):   # skip loading TF otherwise
+        model_cases, close = _bench_model(model_path)
+        cases.update(model_cases)
+
+    results = {}
+    try:
+        for name, fn in cases.items():
+            if only and not name.startswith(only):
+                continue
+            results[name] = _time(fn)
+            logger.info("%-32s %12.1f µs  (%s ops/s)", name, results[name]["median_us"],
+                        results[name]["ops_per_s"])
+    finally:
+        close()
+
+    return {
+        "meta": {
+            "created":  datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python":   platform.python_version(),
+            "numpy":    np.__version__,
+            "machine":  f"{platform.system()} {platform.machine()}",
+            "model":    model_path,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], threshold: float) -> dict[str, Any]:
+    """Per-benchmark median ratio vs the baseline; ``regressed`` when slower by more than ``threshold``."""
+    rows = {}
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            rows[name] = {"status": "new", "median_us": result["median_us"]}
+            continue
+        ratio = result["median_us"] / base["median_us"] if base["median_us"] else 1.0
+        rows[name] = {
+            "status":       "regressed" if ratio > 1 + threshold else
+                            "improved" if ratio < 1 - threshold else "ok",
+            "baseline_us":  base["median_us"],
+            "median_us":    result["median_us"],
+            "ratio":        round(ratio, 3),
+        }
+    regressions = sorted(name for name, row in rows.items() if row["status"] == "regressed")
+    return {
+        "baseline_created": baseline.get("meta", {}).get("created"),
+        "threshold":        threshold,
+        "regressions":      regressions,
+        "benchmarks":       rows,
+    }
+
+
+def run_suite(
+    model_path: str,
+    baseline: str | None = None,
+    save: str | None = None,
+    threshold: float = 0.15,
+    only: str | None = None,
+) -> tuple[dict[str, Any], bool]:
+    """Run, optionally save and compare. Returns (report, passed)."""
+    current = run_benchmarks(model_path, only)
+    if save:
+        Path(save).write_text(json.dumps(current, indent=2) + "\n", encoding="utf-8")
+        logger.info("Benchmark results saved to %s", save)
+
+    if not baseline:
+        return current, True
+    comparison = compare(current, json.loads(Path(baseline).read_text(encoding="utf-8")), threshold)
+    for name in comparison["regressions"]:
+        row = comparison["benchmarks"][name]
+        logger.warning("REGRESSION %-32s %.1f µs → %.1f µs  (×%.2f)",
+                       name, row["baseline_us"], row["median_us"], row["ratio"])
+    return {**current, "comparison": comparison}, not comparison["regressions"]
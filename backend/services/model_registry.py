@@ -0,0 +1,330 @@
+"""
+Model Registry & Hot-Swap
+=========================
+Replaces the serving model without a restart or dropped requests.
+
+Registry layout (MODEL_REGISTRY_DIR)::
+
+    models/
+      manifest.json
+      mobilenetv2_2024-05.keras
+      mobilenetv2_2024-06_int8.tflite
+
+    manifest.json:
+      {
+        "active": "2024-06",
+        "versions": {
+          "2024-05": {"file": "mobilenetv2_2024-05.keras", "notes": "baseline"},
+          "2024-06": {"file": "mobilenetv2_2024-06_int8.tflite"}
+        }
+      }
+
+Swap sequence (ModelManager.swap):
+  1. build a fresh InferencePool for the new file in a background thread and warm it up
+  2. refuse the swap if it came up in mock mode (missing file / failed load)
+  3. assign ``app.state.predictor`` — a single reference swap, atomic on the event loop
+  4. mark the old pool retired and clear the prediction cache + near-duplicate index
+     (their entries came from the old model; requests still draining on it don't write back)
+  5. keep the old pool until every request that leased it has finished, then close it
+
+Requests lease the current pool for their whole lifetime (including streamed
+response bodies) via PredictorLeaseMiddleware, so a request never sees its
+model change or get closed underneath it.
+
+Triggers: the admin endpoint (POST /api/admin/models/swap) or the file watcher,
+which polls the manifest — or MODEL_PATH itself when no registry is configured —
+and swaps when the active version / file changes.
+
+Env vars:
+  MODEL_REGISTRY_DIR   registry directory (unset → serve MODEL_PATH directly)
+  MODEL_WATCH_S        file-watch poll interval in seconds (default 5, 0 disables)
+  SWAP_DRAIN_TIMEOUT   max seconds to wait for in-flight requests on the old model (default 120)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+from services.inference_pool import InferencePool, create_inference_pool
+
+logger = logging.getLogger(__name__)
+
+MODEL_REGISTRY_DIR = os.environ.get("MODEL_REGISTRY_DIR", "")
+MODEL_WATCH_S      = float(os.environ.get("MODEL_WATCH_S", "5"))
+SWAP_DRAIN_TIMEOUT = float(os.environ.get("SWAP_DRAIN_TIMEOUT", "120"))
+
+
+class SwapInProgress(RuntimeError):
+    """Another model swap is still loading or draining."""
+
+
+# ── Registry ──────────────────────────────────────────────────────────────────
+
+class ModelRegistry:
+    """A directory of versioned model files described by ``manifest.json``."""
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, root: str):
+        self.root     = Path(root)
+        self.manifest = self.root / self.MANIFEST
+
+    def read(self) -> dict[str, Any]:
+        data = json.loads(self.manifest.read_text(encoding="utf-8"))
+        data.setdefault("versions", {})
+        return data
+
+    def active(self) -> str | None:
+        return self.read().get("active")
+
+    def path_for(self, version: str) -> Path:
+        """Model file for ``version``; KeyError if the manifest doesn't list it."""
+        entry = self.read()["versions"].get(version)
+        if entry is None:
+            raise KeyError(f"Unknown model version '{version}'")
+        return self.root / entry["file"]
+
+    def set_active(self, version: str) -> None:
+        """Point the manifest at ``version`` (write-then-rename, so readers never see half a file)."""
+        data = self.read()
+        if version not in data["versions"]:
+            raise KeyError(f"Unknown model version '{version}'")
+        data["active"] = version
+        tmp = self.manifest.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        os.replace(tmp, self.manifest)
+
+    def describe(self) -> dict[str, Any]:
+        data = self.read()
+        return {
+            "root":     str(self.root),
+            "active":   data.get("active"),
+            "versions": {
+                version: {**entry, "present": (self.root / entry["file"]).exists()}
+                for version, entry in data["versions"].items()
+            },
+        }
+
+
+# ── Serving-model manager ─────────────────────────────────────────────────────
+
+class ModelManager:
+    """Owns ``app.state.predictor``: initial load, background swaps and draining."""
+
+    def __init__(self, state: Any, default_path: str, registry: ModelRegistry | None = None):
+        self._state       = state
+        self.default_path = default_path
+        self.registry     = registry
+        self.version: str | None = None
+        self.model_path   = default_path
+
+        self._leases: Counter[int] = Counter()      # id(pool) → requests using it
+        self._retiring: list[InferencePool] = []
+        self._lease_lock = threading.Lock()
+        self._swap_lock  = asyncio.Lock()
+        self._swap_task: asyncio.Task | None = None
+        self._watch_task: asyncio.Task | None = None
+        self._watched_mtime = 0.0
+        self.status: dict[str, Any] = {"state": "idle"}
+        self.swaps = 0
+
+    # ── Loading ───────────────────────────────────────────────────────────────
+
+    def _resolve(self, version: str | None) -> tuple[str | None, str]:
+        if self.registry is None:
+            return None, self.default_path
+        version = version or self.registry.active()
+        if version is None:
+            raise KeyError("Registry manifest has no active version")
+        return version, str(self.registry.path_for(version))
+
+    @staticmethod
+    def _build(model_path: str) -> InferencePool:
+        pool = create_inference_pool(model_path)
+        started = time.perf_counter()
+        pool.warmup()
+        logger.info("Model warm-up finished in %.2f s.", time.perf_counter() - started)
+        return pool
+
+    def load_initial(self) -> None:
+        """Blocking startup load of the active version (or MODEL_PATH)."""
+        self.version, self.model_path = self._resolve(None)
+        self._state.predictor = self._build(self.model_path)
+        self._watched_mtime = self._watch_mtime()
+        logger.info("Serving model %s (%s)", self.version or "-", self.model_path)
+
+    # ── Leases (see PredictorLeaseMiddleware) ─────────────────────────────────
+
+    def acquire(self) -> InferencePool:
+        with self._lease_lock:
+            pool = self._state.predictor
+            self._leases[id(pool)] += 1
+            return pool
+
+    def release(self, pool: InferencePool) -> None:
+        with self._lease_lock:
+            self._leases[id(pool)] -= 1
+            if self._leases[id(pool)] <= 0:
+                del self._leases[id(pool)]
+
+    def in_flight(self, pool: InferencePool) -> int:
+        with self._lease_lock:
+            return self._leases.get(id(pool), 0)
+
+    # ── Swapping ──────────────────────────────────────────────────────────────
+
+    @property
+    def swapping(self) -> bool:
+        return self._swap_task is not None and not self._swap_task.done()
+
+    def start_swap(self, version: str | None = None, persist: bool = False) -> None:
+        """Kick off ``swap`` in the background; SwapInProgress / KeyError are raised here."""
+        if self.swapping:
+            raise SwapInProgress(f"Swap to {self.status.get('target')} still {self.status['state']}")
+        target, model_path = self._resolve(version)   # validate before returning 202
+        self.status = {"state": "queued", "target": target or model_path}
+        self._swap_task = asyncio.create_task(self.swap(version, persist))
+
+    async def swap(self, version: str | None = None, persist: bool = False) -> bool:
+        """
+        Load, warm, swap, drain. Returns False (and keeps the old model) if loading failed.
+        With ``persist`` the manifest's active version is updated once the new model is
+        serving, so a failed load never leaves the next restart pointed at it.
+        """
+        async with self._swap_lock:
+            version, model_path = self._resolve(version)
+            self.status = {"state": "loading", "target": version or model_path, "started_at": time.time()}
+            logger.info("Model swap: loading %s (%s) in the background …", version or "-", model_path)
+
+            try:
+                pool = await asyncio.to_thread(self._build, model_path)
+            except Exception as exc:
+                logger.exception("Model swap failed while loading %s: %s", model_path, exc)
+                self.status = {**self.status, "state": "failed", "error": str(exc)}
+                return False
+            if not pool.model_loaded:
+                await asyncio.to_thread(pool.close)
+                logger.error("Model swap aborted: %s did not load (mock fallback) — keeping %s",
+                             model_path, self.version or self.model_path)
+                self.status = {**self.status, "state": "failed", "error": "model failed to load"}
+                return False
+
+            old = self._state.predictor
+            self._state.predictor = pool
+            old.retired = True   # its in-flight results must not repopulate the caches
+            self.version, self.model_path = version, model_path
+            self.swaps += 1
+            if persist and self.registry is not None and version is not None:
+                try:
+                    self.registry.set_active(version)   # watcher sees active == self.version
+                except (OSError, KeyError, ValueError) as exc:
+                    logger.error("Model swap: serving %s but could not update the manifest: %s", version, exc)
+            for attr in ("prediction_cache", "near_duplicates"):
+                if hasattr(self._state, attr):
+                    getattr(self._state, attr).clear()
+            logger.info("Model swap: now serving %s (%s)", version or "-", model_path)
+
+            self.status = {**self.status, "state": "draining", "old_in_flight": self.in_flight(old)}
+            self._retiring.append(old)
+            await self._drain(old)
+            self._retiring.remove(old)
+            self.status = {"state": "idle", "last_swap": version or model_path, "finished_at": time.time()}
+            return True
+
+    async def _drain(self, old: InferencePool) -> None:
+        deadline = time.monotonic() + SWAP_DRAIN_TIMEOUT
+        while self.in_flight(old) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.in_flight(old):
+            logger.warning("Model swap: %d requests still on the old model after %.0f s — closing it anyway",
+                           self.in_flight(old), SWAP_DRAIN_TIMEOUT)
+        await asyncio.to_thread(old.close)
+        logger.info("Model swap: old model drained and closed.")
+
+    # ── File watcher ──────────────────────────────────────────────────────────
+
+    def _watch_mtime(self) -> float:
+        target = self.registry.manifest if self.registry else Path(self.default_path)
+        try:
+            return target.stat().st_mtime
+        except OSError:
+            return 0.0
+
+    def start_watching(self, interval: float = MODEL_WATCH_S) -> None:
+        if interval > 0:
+            self._watch_task = asyncio.create_task(self._watch(interval))
+
+    async def _watch(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            mtime = self._watch_mtime()
+            if not mtime or mtime == self._watched_mtime or self.swapping:
+                continue
+            self._watched_mtime = mtime
+            try:
+                if self.registry is not None and self.registry.active() == self.version:
+                    continue   # manifest edited, active version unchanged
+                logger.info("Model watcher: change detected — swapping.")
+                self.start_swap()
+            except Exception as exc:
+                logger.error("Model watcher: could not start swap: %s", exc)
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "serving":   {"version": self.version, "model_path": self.model_path,
+                          "in_flight": self.in_flight(self._state.predictor)},
+            "swap":      self.status,
+            "swaps":     self.swaps,
+            "retiring":  len(self._retiring),
+            "registry":  self.registry.describe() if self.registry else None,
+        }
+
+    async def close(self) -> None:
+        for task in (self._watch_task, self._swap_task):
+            if task is not None and not task.done():
+                task.cancel()
+        for pool in [*self._retiring, self._state.predictor]:
+            pool.close()
+
+
+def create_model_manager(state: Any, default_path: str) -> ModelManager:
+    """Build the manager configured by MODEL_REGISTRY_DIR (falls back to ``default_path``)."""
+    registry = ModelRegistry(MODEL_REGISTRY_DIR) if MODEL_REGISTRY_DIR else None
+    return ModelManager(state, default_path, registry)
+
+
+# ── ASGI middleware ───────────────────────────────────────────────────────────
+
+class PredictorLeaseMiddleware:
+    """
+    Pins each HTTP request to the pool that was serving when it arrived and
+    holds that lease until the response (streamed bodies included) is sent.
+    The pinned pool is exposed as ``request.state.predictor``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        manager: ModelManager | None = getattr(scope["app"].state, "models", None) \
+            if scope["type"] == "http" else None
+        if manager is None:
+            await self.app(scope, receive, send)
+            return
+
+        pool = manager.acquire()
+        scope.setdefault("state", {})["predictor"] = pool
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            manager.release(pool)
@@ -0,0 +1,165 @@
+"""
+Near-Duplicate Prediction Index
+===============================
+Catches re-encoded, resized or re-compressed copies of a photo that the
+exact-bytes PredictionCache misses (WhatsApp forwards, screenshots, app
+re-uploads at a different quality).
+
+Each image gets a 64-bit perceptual hash (pHash): shrink the decoded image
+to a 32×32 grayscale thumbnail, take its 2-D DCT, keep the 8×8 lowest
+frequencies and set one bit per coefficient above their median. Visually
+identical images land within a few bits of each other. The hash is taken
+from the resized model input, and on a miss the model is fed those same
+pixels, so a cache miss costs one decode, not two. With
+INFERENCE_EXECUTOR=process uploads go to the workers undecoded and the
+index is not consulted (the exact-bytes cache still is).
+
+Lookup uses multi-index hashing: the 64 bits are split into ``threshold + 1``
+bands, so any hash within ``threshold`` bits of a stored one must match it
+exactly on at least one band (pigeonhole). Each band is a plain dict, which
+keeps lookups O(candidates) instead of scanning every entry.
+
+Env vars:
+  NEAR_DUP_THRESHOLD  max Hamming distance for a hit (default 3)
+  NEAR_DUP_ENTRIES    max entries, LRU-evicted      (default 4096, 0 disables)
+  NEAR_DUP_TTL        seconds per entry             (default 3600)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+import numpy as np
+from PIL import Image
+
+NEAR_DUP_THRESHOLD = int(os.environ.get("NEAR_DUP_THRESHOLD", "3"))
+NEAR_DUP_ENTRIES   = int(os.environ.get("NEAR_DUP_ENTRIES", "4096"))
+NEAR_DUP_TTL       = float(os.environ.get("NEAR_DUP_TTL", "3600"))
+
+_THUMB = 32
+_KEEP  = 8
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis, so ``D @ X @ D.T`` is the 2-D DCT of X."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    mat = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    mat[0] /= np.sqrt(2)
+    return mat.astype(np.float32)
+
+
+_DCT     = _dct_matrix(_THUMB)
+_DCT_LOW = _DCT[:_KEEP]                         # only the rows we keep
+_WEIGHTS = 1 << np.arange(63, -1, -1, dtype=np.uint64)
+
+
+def perceptual_hash(img: Image.Image) -> int:
+    """64-bit pHash of a decoded image."""
+    thumb = np.asarray(
+        img.convert("L").resize((_THUMB, _THUMB), Image.BILINEAR), dtype=np.float32,
+    )
+    low  = _DCT_LOW @ thumb @ _DCT_LOW.T         # (8, 8) low-frequency block
+    bits = (low > np.median(low)).ravel()
+    return int(np.sum(_WEIGHTS[bits]))
+
+
+def _bands(threshold: int) -> list[tuple[int, int]]:
+    """Split 64 bits into ``threshold + 1`` (shift, mask) bands."""
+    count  = min(max(threshold, 0) + 1, 64)
+    bounds = np.linspace(0, 64, count + 1).astype(int)
+    return [(int(lo), (1 << int(hi - lo)) - 1) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+class NearDuplicateIndex:
+    """Thread-safe pHash → prediction map answering "anything within N bits?"."""
+
+    def __init__(self, threshold: int, max_entries: int, ttl_seconds: float):
+        self.threshold   = max(0, threshold)
+        self.max_entries = max(0, max_entries)
+        self.ttl         = ttl_seconds
+
+        self._band_spec = _bands(self.threshold)
+        self._bands: list[dict[int, set[int]]] = [{} for _ in self._band_spec]
+        self._entries: OrderedDict[int, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._lock  = threading.Lock()
+        self.hits   = 0
+        self.misses = 0
+        self._distance_sum = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def lookup(self, phash: int) -> dict[str, Any] | None:
+        """Closest stored prediction within ``threshold`` bits, or None."""
+        now = time.monotonic()
+        with self._lock:
+            candidates: set[int] = set()
+            for (shift, mask), band in zip(self._band_spec, self._bands):
+                candidates |= band.get((phash >> shift) & mask, set())
+
+            within = sorted(
+                (dist, cand) for cand in candidates
+                if (dist := (cand ^ phash).bit_count()) <= self.threshold
+            )
+            for dist, cand in within:
+                if self._entries[cand][0] <= now:
+                    self._remove(cand)   # expired — a farther match may still be live
+                    continue
+                self._entries.move_to_end(cand)
+                self.hits += 1
+                self._distance_sum += dist
+                return self._entries[cand][1]
+
+            self.misses += 1
+            return None
+
+    def add(self, phash: int, value: dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if phash in self._entries:
+                self._remove(phash)
+            self._entries[phash] = (time.monotonic() + self.ttl, value)
+            for (shift, mask), band in zip(self._band_spec, self._bands):
+                band.setdefault((phash >> shift) & mask, set()).add(phash)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            for band in self._bands:
+                band.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries":       len(self._entries),
+                "threshold":     self.threshold,
+                "hits":          self.hits,
+                "misses":        self.misses,
+                "hit_rate":      round(self.hits / lookups, 4) if lookups else 0.0,
+                "mean_distance": round(self._distance_sum / self.hits, 2) if self.hits else 0.0,
+            }
+
+    def _remove(self, phash: int) -> None:
+        del self._entries[phash]
+        for (shift, mask), band in zip(self._band_spec, self._bands):
+            key = (phash >> shift) & mask
+            members = band.get(key)
+            if members is not None:
+                members.discard(phash)
+                if not members:
+                    del band[key]
+
+
+def create_near_duplicate_index() -> NearDuplicateIndex:
+    """Build the index configured by the NEAR_DUP_* env vars."""
+    return NearDuplicateIndex(NEAR_DUP_THRESHOLD, NEAR_DUP_ENTRIES, NEAR_DUP_TTL)
@@ -0,0 +1,116 @@
+"""
+Prediction Cache
+================
+Content-addressed LRU + TTL cache for raw predictor output, keyed on a hash of
+the uploaded image bytes. Farmers often re-send the exact same photo (retries
+on flaky rural networks, images forwarded over WhatsApp); a hit skips decode
+and inference entirely.
+
+Bounds (env vars):
+  PREDICTION_CACHE_ENTRIES    max entries          (default 4096, 0 disables)
+  PREDICTION_CACHE_TTL        seconds per entry    (default 3600)
+  PREDICTION_CACHE_MAX_BYTES  approx. memory bound (default 8 MB)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+PREDICTION_CACHE_ENTRIES   = int(os.environ.get("PREDICTION_CACHE_ENTRIES", "4096"))
+PREDICTION_CACHE_TTL       = float(os.environ.get("PREDICTION_CACHE_TTL", "3600"))
+PREDICTION_CACHE_MAX_BYTES = int(os.environ.get("PREDICTION_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+_ENTRY_OVERHEAD = 256   # rough per-entry cost of the key, tuple and OrderedDict node
+
+
+def _estimate_size(value: dict[str, Any]) -> int:
+    """Cheap approximation of an entry's footprint — only computed on insert."""
+    return _ENTRY_OVERHEAD + len(repr(value))
+
+
+class PredictionCache:
+    """Thread-safe LRU with per-entry expiry and an approximate byte budget."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, max_bytes: int):
+        self.max_entries = max(0, max_entries)
+        self.ttl         = ttl_seconds
+        self.max_bytes   = max_bytes
+
+        self._data: OrderedDict[str, tuple[float, int, dict[str, Any]]] = OrderedDict()
+        self._bytes  = 0
+        self._lock   = threading.Lock()
+        self.hits    = 0
+        self.misses  = 0
+        self.expired = 0
+        self.evicted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def key(image_bytes: bytes) -> str:
+        return hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = entry
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                self._bytes -= size
+                self.expired += 1
+                self.misses  += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        size = _estimate_size(value)
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._bytes  -= evicted_size
+                self.evicted += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries":      len(self._data),
+                "approx_bytes": self._bytes,
+                "hits":         self.hits,
+                "misses":       self.misses,
+                "hit_rate":     round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired":      self.expired,
+                "evicted":      self.evicted,
+                "max_entries":  self.max_entries,
+                "max_bytes":    self.max_bytes,
+                "ttl_s":        self.ttl,
+            }
+
+
+def create_prediction_cache() -> PredictionCache:
+    """Build the cache configured by the PREDICTION_CACHE_* env vars."""
+    return PredictionCache(PREDICTION_CACHE_ENTRIES, PREDICTION_CACHE_TTL, PREDICTION_CACHE_MAX_BYTES)
@@ -1,8 +1,13 @@
 """
 ML Inference Service
 ====================
-Handles loading the trained MobileNetV2 Keras model and running predictions.
-Falls back to a mock predictor if no model file is present (for development).
+Handles loading the trained MobileNetV2 model and running predictions.
+The runtime is picked from the MODEL_PATH file extension:
+  .keras / .h5  → KerasPredictor   (full TensorFlow)
+  .tflite       → TFLitePredictor  (tflite_runtime, float or INT8)
+  .onnx         → ONNXPredictor    (ONNX Runtime CPU, float or INT8)
+Falls back to a mock predictor if no model file is present (for development);
+MODEL_PATH=synthetic selects the load-testing stand-in in services.synthetic.
 
 Architecture (from PlantCare AI doc):
   Input (224×224×3) → MobileNetV2 base → GAP → Dropout(0.35) → Dense(256)
@@ -15,12 +20,21 @@ import io
 import logging
 import os
 import random
+import threading
+import time
 from pathlib import Path
-from typing import Any
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Iterable
 
 import numpy as np
 from PIL import Image
 
+from services.metrics import observe_batch, record_stage
+
+if TYPE_CHECKING:
+    from services.batching import BatchingPredictor
+    from services.shm_workers import SharedMemoryPredictor
+
 logger = logging.getLogger(__name__)
 
 # ── 38-Class Label List (must match training order) ───────────────────────────
@@ -67,28 +81,164 @@ CLASS_NAMES: list[str] = [
 
 IMG_SIZE = (224, 224)
 
+# Intra-op threads for the TFLite / ONNX runtimes (0 = runtime default)
+RUNTIME_THREADS = int(os.environ.get("RUNTIME_THREADS", "0"))
+
+# TFLite: allocated interpreters kept per batch size (LRU) — resizing one reallocates it
+TFLITE_INTERPRETERS = int(os.environ.get("TFLITE_INTERPRETERS", "8"))
+
+# Let libjpeg downscale in the DCT domain while decoding (set 0 to force full decode)
+JPEG_DRAFT_DECODE = os.environ.get("JPEG_DRAFT_DECODE", "1") == "1"
+
+# XLA-compile the Keras serving function (faster steady state, one compile per batch shape)
+KERAS_XLA = os.environ.get("KERAS_XLA", "0") == "1"
+
+# Optional low-resolution gate model in front of the full one (see services.cascade)
+GATE_MODEL_PATH   = os.environ.get("GATE_MODEL_PATH", "")
+CASCADE_THRESHOLD = float(os.environ.get("CASCADE_THRESHOLD", "0.9"))
+
 
 # ── Helper: preprocess image bytes ───────────────────────────────────────────
 
-def preprocess_image(image_bytes: bytes) -> np.ndarray:
+def decode_image(image_bytes: bytes, size: tuple[int, int] = IMG_SIZE) -> Image.Image:
     """
-    Convert raw image bytes to a preprocessed numpy array ready for MobileNetV2.
-    Steps: decode → RGB → resize to 224×224 → MobileNetV2 preprocess → add batch dim.
+    Decode image bytes to an RGB PIL image no smaller than ``size``.
+
+    For JPEGs, ``draft()`` asks libjpeg to decode at 1/2, 1/4 or 1/8 scale
+    straight from the DCT coefficients — a 12 MP phone photo comes out near
+    500×375 instead of 4000×3000, which cuts decode time and peak memory
+    several-fold. Other formats are decoded in full.
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    if JPEG_DRAFT_DECODE:
+        img.draft("RGB", size)   # no-op for non-JPEG formats
+    return img.convert("RGB")
+
+
+_SCALE = np.float32(1 / 127.5)
+
+
+def preprocess_into(image_bytes: bytes, out: np.ndarray) -> np.ndarray:
+    """
+    Decode + resize ``image_bytes`` and write the MobileNetV2 input directly
+    into ``out`` (a preallocated (224, 224, 3) float32 view — or the model's
+    own (H, W, 3) input size), in place.
+    The uint8 → float32 cast is fused with the scale, so no temporaries.
     """
-    img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    img = img.resize(IMG_SIZE, Image.BILINEAR)
-    arr = np.array(img, dtype=np.float32)
+    size = (out.shape[1], out.shape[0])
+    img = decode_image(image_bytes, size)
+    img = img.resize(size, Image.BILINEAR)
 
     # MobileNetV2 preprocessing: scale to [-1, 1]
-    arr = (arr / 127.5) - 1.0
+    np.multiply(np.asarray(img), _SCALE, out=out, casting="unsafe")
+    out -= 1.0
+    return out
+
+
+def preprocess_image(image_bytes: bytes, size: tuple[int, int] = IMG_SIZE) -> np.ndarray:
+    """
+    Convert raw image bytes to a preprocessed numpy array ready for MobileNetV2.
+    Steps: decode (reduced-resolution for JPEG) → RGB → resize to 224×224
+           (or ``size``) → MobileNetV2 preprocess → add batch dim.
+    """
+    arr = np.empty((1, *size, 3), dtype=np.float32)   # shape: (1, 224, 224, 3)
+    preprocess_into(image_bytes, arr[0])
+    return arr
+
+
+def preprocess_array_into(frame: np.ndarray, out: np.ndarray, bgr: bool = True) -> np.ndarray:
+    """
+    Resize a uint8 (H, W, 3) camera frame and write the MobileNetV2 input
+    directly into ``out``, in place — no JPEG encode / decode round-trip.
+    PIL resizes each channel independently, so a BGR frame can be resized as
+    is; the BGR → RGB swap is then a reversed-channel view read by the fused
+    cast + scale, so colour conversion costs no extra pass or copy.
+    """
+    size = (out.shape[1], out.shape[0])
+    img = Image.fromarray(frame)
+    if img.size != size:
+        img = img.resize(size, Image.BILINEAR)
 
-    return np.expand_dims(arr, axis=0)  # shape: (1, 224, 224, 3)
+    pixels = np.asarray(img)
+    if bgr:
+        pixels = pixels[..., ::-1]
+    np.multiply(pixels, _SCALE, out=out, casting="unsafe")
+    out -= 1.0
+    return out
+
+
+def preprocess_array(frame: np.ndarray, size: tuple[int, int] = IMG_SIZE, bgr: bool = True) -> np.ndarray:
+    """``preprocess_image`` for an in-memory uint8 frame (OpenCV BGR by default)."""
+    arr = np.empty((1, *size, 3), dtype=np.float32)
+    preprocess_array_into(frame, arr[0], bgr)
+    return arr
+
+
+# ── Helper: probabilities → response dict ────────────────────────────────────
+
+def format_prediction(probs: np.ndarray) -> dict[str, Any]:
+    """Turn one softmax vector (shape: (38,)) into the predictor result dict."""
+    top_idx = int(np.argmax(probs))
+    top5_idx = np.argsort(probs)[::-1][:5]
+
+    return {
+        "class_name": CLASS_NAMES[top_idx],
+        "confidence": float(probs[top_idx]),
+        "top5": [
+            {"class": CLASS_NAMES[i], "confidence": float(probs[i])}
+            for i in top5_idx
+        ],
+    }
+
+
+# ── Shared base for real-model predictors ────────────────────────────────────
+
+class TensorPredictor:
+    """
+    Base class for predictors backed by a real model. Subclasses implement
+    ``predict_tensor``; single-image ``predict`` is built on top of it.
+    """
+
+    model_loaded = True
+    pad_batches  = False      # True → only fixed batch shapes are cheap (see services.batching)
+    input_size   = IMG_SIZE   # square model input; smaller for cascade gate models
+
+    def predict_tensor(self, batch: np.ndarray) -> np.ndarray:
+        """Run a preprocessed (N, 224, 224, 3) batch; returns (N, 38) probabilities."""
+        raise NotImplementedError
+
+    def warmup(self, batch_sizes: Iterable[int] = (1,)) -> None:
+        """Run dummy batches so tracing / graph compilation happens before real traffic."""
+        for n in batch_sizes:
+            self.predict_tensor(np.zeros((n, *self.input_size, 3), dtype=np.float32))
+
+    def predict(self, image_bytes: bytes) -> dict[str, Any]:
+        return self._predict_one(preprocess_image, image_bytes, self.input_size)
+
+    def predict_array(self, frame: np.ndarray, bgr: bool = True) -> dict[str, Any]:
+        """Classify a raw uint8 (H, W, 3) frame, e.g. straight from cv2.VideoCapture."""
+        return self._predict_one(preprocess_array, frame, self.input_size, bgr)
+
+    def _predict_one(self, preprocess, *args) -> dict[str, Any]:
+        started = time.perf_counter()
+        arr = preprocess(*args)
+        decoded = time.perf_counter()
+        probs = self.predict_tensor(arr)[0]                    # shape: (38,)
+        finished = time.perf_counter()
+        record_stage("preprocess", decoded - started)
+        record_stage("inference", finished - decoded)
+        observe_batch(1, finished - decoded)
+        return format_prediction(probs)
 
 
 # ── Real Keras Model Predictor ────────────────────────────────────────────────
 
-class KerasPredictor:
-    """Loads the trained .keras model and runs inference."""
+class KerasPredictor(TensorPredictor):
+    """
+    Loads the trained .keras model and runs inference through a traced
+    ``tf.function`` serving signature instead of ``model.predict``, which
+    rebuilds its data adapter and predict loop on every call.
+    """
 
     def __init__(self, model_path: str):
         import tensorflow as tf  # deferred import — optional at server startup
@@ -97,20 +247,136 @@ class KerasPredictor:
         logger.info("Model loaded successfully (%d parameters).",
                     self.model.count_params())
 
-    def predict(self, image_bytes: bytes) -> dict[str, Any]:
-        arr = preprocess_image(image_bytes)
-        probs = self.model.predict(arr, verbose=0)[0]          # shape: (38,)
-        top_idx = int(np.argmax(probs))
-        top5_idx = np.argsort(probs)[::-1][:5]
+        self.input_size = _square_size(self.model.input_shape[1:3])
+        self._tf = tf
+        self._serve = tf.function(
+            lambda x: self.model(x, training=False),
+            input_signature=[tf.TensorSpec(shape=[None, *self.input_size, 3], dtype=tf.float32)],
+            jit_compile=KERAS_XLA,
+        )
+        # XLA specialises on concrete shapes, so the batcher pads to a few fixed sizes.
+        self.pad_batches = KERAS_XLA
 
-        return {
-            "class_name": CLASS_NAMES[top_idx],
-            "confidence": float(probs[top_idx]),
-            "top5": [
-                {"class": CLASS_NAMES[i], "confidence": float(probs[i])}
-                for i in top5_idx
-            ],
-        }
+    def predict_tensor(self, batch: np.ndarray) -> np.ndarray:
+        x = self._tf.convert_to_tensor(batch, dtype=self._tf.float32)
+        return self._serve(x).numpy()
+
+
+# ── TFLite Predictor (float or INT8-quantized .tflite) ───────────────────────
+
+class TFLitePredictor(TensorPredictor):
+    """
+    Runs a .tflite export of the model. Prefers the standalone ``tflite_runtime``
+    package (a few MB) and only falls back to full TensorFlow's interpreter.
+    Quantized models are fed/read through their input/output scale + zero point.
+    """
+
+    def __init__(self, model_path: str):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        logger.info("Loading TFLite model from %s …", model_path)
+        self._new_interpreter = lambda: Interpreter(model_path=model_path, num_threads=RUNTIME_THREADS or None)
+        self._lock = threading.Lock()   # an Interpreter must not be invoked concurrently
+        # Resizing an interpreter's input reallocates all of its tensors, so each batch
+        # size gets its own, already-allocated interpreter; the batcher pads to a few
+        # fixed sizes so only a handful ever exist.
+        self._interpreters: OrderedDict[int, tuple[Any, dict, dict]] = OrderedDict()
+        self.pad_batches = True
+        _, self._input, _ = self._interpreter_for(None)
+        self.input_size = _square_size(self._input["shape"][1:3])
+        logger.info("TFLite model loaded (input %s, %s).", self._input["dtype"].__name__,
+                    "INT8-quantized" if self._input["quantization"][0] else "float")
+
+    def _interpreter_for(self, batch_size: int | None) -> tuple[Any, dict, dict]:
+        """Allocated (interpreter, input details, output details) for ``batch_size`` (None: as exported)."""
+        entry = self._interpreters.get(batch_size) if batch_size is not None else None
+        if entry is not None:
+            self._interpreters.move_to_end(batch_size)
+            return entry
+
+        interpreter = self._new_interpreter()
+        inp = interpreter.get_input_details()[0]
+        if batch_size is not None and inp["shape"][0] != batch_size:
+            interpreter.resize_tensor_input(inp["index"], [batch_size, *inp["shape"][1:]])
+        interpreter.allocate_tensors()
+        entry = (interpreter, interpreter.get_input_details()[0], interpreter.get_output_details()[0])
+        self._interpreters[int(entry[1]["shape"][0])] = entry
+        while len(self._interpreters) > TFLITE_INTERPRETERS:
+            self._interpreters.popitem(last=False)
+        return entry
+
+    def predict_tensor(self, batch: np.ndarray) -> np.ndarray:
+        with self._lock:
+            interpreter, inp, out = self._interpreter_for(len(batch))
+            interpreter.set_tensor(inp["index"], _quantize(batch, inp))
+            interpreter.invoke()
+            result = interpreter.get_tensor(out["index"])
+        return _dequantize(result, out)
+
+
+def _square_size(dims: Any) -> tuple[int, int]:
+    """Model input (H, W) from a shape slice; dynamic / unknown dims mean the default 224."""
+    dims = tuple(dims)
+    if len(dims) == 2 and all(isinstance(d, (int, np.integer)) and d > 0 for d in dims):
+        return int(dims[0]), int(dims[1])
+    return IMG_SIZE
+
+
+def _quantize(batch: np.ndarray, detail: dict[str, Any]) -> np.ndarray:
+    dtype = detail["dtype"]
+    scale, zero_point = detail["quantization"]
+    if not np.issubdtype(dtype, np.integer) or not scale:
+        return batch.astype(dtype, copy=False)
+    info = np.iinfo(dtype)
+    return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+
+def _dequantize(out: np.ndarray, detail: dict[str, Any]) -> np.ndarray:
+    scale, zero_point = detail["quantization"]
+    if not np.issubdtype(out.dtype, np.integer) or not scale:
+        return out.astype(np.float32, copy=False)
+    return (out.astype(np.float32) - zero_point) * scale
+
+
+# ── ONNX Runtime Predictor (float or INT8-quantized .onnx) ───────────────────
+
+class ONNXPredictor(TensorPredictor):
+    """
+    Runs a .onnx export on ONNX Runtime's CPU provider. QDQ / dynamically
+    quantized INT8 models keep float I/O, so they need no special handling;
+    NCHW exports are transposed on the way in.
+    """
+
+    def __init__(self, model_path: str):
+        import onnxruntime as ort  # deferred import — optional dependency
+
+        logger.info("Loading ONNX model from %s …", model_path)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if RUNTIME_THREADS:
+            options.intra_op_num_threads = RUNTIME_THREADS
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"],
+        )
+
+        inp = self.session.get_inputs()[0]
+        self._input_name = inp.name
+        self._nchw = len(inp.shape) == 4 and inp.shape[1] == 3
+        self.input_size = _square_size(inp.shape[2:4] if self._nchw else inp.shape[1:3])
+        self._raw_pixels = inp.type == "tensor(uint8)"   # model does its own scaling
+        logger.info("ONNX model loaded (input %s %s).", inp.type, "NCHW" if self._nchw else "NHWC")
+
+    def predict_tensor(self, batch: np.ndarray) -> np.ndarray:
+        x = batch
+        if self._raw_pixels:
+            x = np.round((x + 1.0) * 127.5).astype(np.uint8)
+        if self._nchw:
+            x = np.ascontiguousarray(x.transpose(0, 3, 1, 2))
+        return self.session.run(None, {self._input_name: x})[0]
 
 
 # ── Mock Predictor (development / demo) ──────────────────────────────────────
@@ -133,22 +399,29 @@ class MockPredictor:
         "Corn_(maize)___Northern_Leaf_Blight",
         "Pepper,_bell___Bacterial_spot",
     ]
-    _counter = 0
+    model_loaded = False
+
+    def __init__(self, seed: int | None = None):
+        self._rng  = random.Random(seed)
+        self._lock = threading.Lock()   # random.Random isn't safe to share across threads
+        # Per demo class: the 37 other classes in a fixed shuffled order (top5 fillers)
+        self._others = []
+        for idx, primary in enumerate(self._DEMO_CLASSES):
+            remaining = [c for c in CLASS_NAMES if c != primary]
+            random.Random(idx).shuffle(remaining)
+            self._others.append(remaining[:4])
 
     def predict(self, image_bytes: bytes) -> dict[str, Any]:
         # Use image byte checksum as seed so same image → same result
         seed = sum(image_bytes[:64]) % len(self._DEMO_CLASSES)
         primary = self._DEMO_CLASSES[seed]
-        primary_conf = round(random.uniform(0.82, 0.97), 4)
-
-        remaining = [c for c in CLASS_NAMES if c != primary]
-        random.seed(seed)
-        random.shuffle(remaining)
-        others = remaining[:4]
-        other_confs = sorted(
-            [round(random.uniform(0.001, (1 - primary_conf) / 2), 4) for _ in others],
-            reverse=True,
-        )
+        others  = self._others[seed]
+        with self._lock:
+            primary_conf = round(self._rng.uniform(0.82, 0.97), 4)
+            other_confs = sorted(
+                [round(self._rng.uniform(0.001, (1 - primary_conf) / 2), 4) for _ in others],
+                reverse=True,
+            )
 
         top5 = [{"class": primary, "confidence": primary_conf}] + [
             {"class": c, "confidence": conf} for c, conf in zip(others, other_confs)
@@ -160,16 +433,61 @@ class MockPredictor:
             "top5": top5,
         }
 
+    def predict_array(self, frame: np.ndarray, bgr: bool = True) -> dict[str, Any]:
+        return self.predict(np.ravel(frame)[:64].tobytes())
+
 
 # ── Factory ────────────────────────────────────────────────────────────────────
 
-def load_predictor(model_path: str) -> KerasPredictor | MockPredictor:
+_BACKENDS: dict[str, type[TensorPredictor]] = {
+    ".keras":  KerasPredictor,
+    ".h5":     KerasPredictor,
+    ".tflite": TFLitePredictor,
+    ".onnx":   ONNXPredictor,
+}
+
+
+def _with_gate(full: TensorPredictor, gate_path: str) -> TensorPredictor:
+    """Put the low-resolution gate model in front of ``full``; ``full`` alone if it can't load."""
+    gate_backend = _BACKENDS.get(Path(gate_path).suffix.lower(), KerasPredictor)
+    try:
+        gate = gate_backend(gate_path)
+    except Exception as exc:
+        logger.error("Failed to load gate model '%s': %s — cascade disabled.", gate_path, exc)
+        return full
+
+    from services.cascade import CascadePredictor
+    logger.info("Confidence cascade: %dx%d gate '%s' → full model below %.2f confidence",
+                *gate.input_size, gate_path, CASCADE_THRESHOLD)
+    return CascadePredictor(gate, full, CASCADE_THRESHOLD)
+
+
+def load_predictor(
+    model_path: str,
+    batching: bool = True,
+    workers: int | None = None,
+) -> TensorPredictor | BatchingPredictor | SharedMemoryPredictor | MockPredictor:
     """
-    Try to load the real Keras model. Fall back to MockPredictor if:
+    Try to load the real model (runtime chosen by file extension). Fall back
+    to MockPredictor if:
       - The model file does not exist, or
-      - TensorFlow is not installed.
+      - The runtime for that format is not installed.
+
+    ``workers`` > 0 (default: SHM_WORKERS env) selects the multi-process
+    shared-memory backend instead of an in-process model.
+
+    ``model_path="synthetic"`` serves a SyntheticPredictor (simulated latency,
+    no model file) through the same batching / worker stack, for load tests.
+
+    With GATE_MODEL_PATH set, the model is fronted by a CascadePredictor that
+    only escalates low-confidence images to it.
+
+    Real models are wrapped in a BatchingPredictor unless BATCH_MAX_SIZE=1 or
+    ``batching=False`` (single-caller contexts such as process-pool workers).
     """
-    if not Path(model_path).exists():
+    from services.synthetic import SYNTHETIC_MODEL, create_synthetic_predictor
+    synthetic = model_path == SYNTHETIC_MODEL
+    if not synthetic and not Path(model_path).exists():
         logger.warning(
             "Model file '%s' not found — starting in MOCK / DEMO mode. "
             "Place your trained mobilenetv2_best.keras at that path to enable real inference.",
@@ -177,8 +495,31 @@ def load_predictor(model_path: str) -> KerasPredictor | MockPredictor:
         )
         return MockPredictor()
 
+    from services.shm_workers import SHM_SLOTS_PER_WORKER, SHM_WORKERS, SharedMemoryPredictor
+    workers = SHM_WORKERS if workers is None else workers
+    if workers > 0:
+        try:
+            return SharedMemoryPredictor(model_path, workers, SHM_SLOTS_PER_WORKER)
+        except Exception as exc:
+            logger.error("Failed to start inference workers: %s — falling back to mock predictor.", exc)
+            return MockPredictor()
+
+    backend = _BACKENDS.get(Path(model_path).suffix.lower(), KerasPredictor)
     try:
-        return KerasPredictor(model_path)
+        if synthetic:
+            predictor = create_synthetic_predictor()
+        else:
+            predictor = backend(model_path)
     except Exception as exc:
-        logger.error("Failed to load Keras model: %s — falling back to mock predictor.", exc)
+        logger.error("Failed to load model with %s: %s — falling back to mock predictor.",
+                     "SyntheticPredictor" if synthetic else backend.__name__, exc)
         return MockPredictor()
+
+    if GATE_MODEL_PATH and not synthetic:
+        predictor = _with_gate(predictor, GATE_MODEL_PATH)
+
+    from services.batching import BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, BatchingPredictor
+    if batching and BATCH_MAX_SIZE > 1:
+        return BatchingPredictor(predictor, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+    return predictor
+
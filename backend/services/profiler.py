@@ -0,0 +1,142 @@
+"""
+Sampling Profiler
+=================
+A low-overhead, in-process sampling profiler for when production latency spikes
+and no external profiler can be attached to the container.
+
+A daemon thread wakes ``hz`` times a second, snapshots every thread's Python
+stack via ``sys._current_frames()`` and counts identical stacks. Nothing is
+traced between samples, so the cost is roughly (threads × stack depth) frame
+reads per tick — negligible at 100 Hz. Samples of threads parked in a lock,
+queue or selector wait are dropped unless ``include_idle`` is set, so the
+profile shows where CPU time goes rather than where threads sleep. The sampler
+needs the GIL like any other thread, so under pure-Python CPU load the achieved
+rate falls below ``hz``; ``samples`` reports how many ticks actually ran.
+
+Output is the collapsed-stack format (``thread;outer;…;leaf count`` per line)
+read by flamegraph.pl, speedscope and inferno:
+
+  curl -X POST -H "X-Admin-Token: $ADMIN_TOKEN" \\
+       "http://localhost:8000/api/admin/profile?seconds=30" > app.folded
+  flamegraph.pl app.folded > app.svg
+
+Env vars (per-request sampling of /api/predict):
+  PROFILE_EVERY_N      profile every Nth /api/predict request (default 0 = off)
+  PROFILE_REQUEST_HZ   sampling rate for those requests (default 1000)
+  PROFILE_DIR          where their ``.folded`` files are written (default "profiles")
+
+A request profile samples every thread while that request runs, so under
+concurrent load it includes whatever else the process was doing.
+"""
+
+from __future__ import annotations
+
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator
+
+logger = logging.getLogger(__name__)
+
+PROFILE_EVERY_N    = int(os.environ.get("PROFILE_EVERY_N", "0"))
+PROFILE_REQUEST_HZ = float(os.environ.get("PROFILE_REQUEST_HZ", "1000"))
+PROFILE_DIR        = os.environ.get("PROFILE_DIR", "profiles")
+
+# (file suffix, function) of leaf frames that mean "this thread is waiting"
+_IDLE_LEAVES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"), ("selectors.py", "select"), ("connection.py", "_recv"),
+    ("thread.py", "_worker"),
+}
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Counts collapsed stacks of every thread (except its own) at ``hz`` samples/s."""
+
+    def __init__(self, hz: float = 100.0, include_idle: bool = False):
+        self.interval     = 1.0 / max(1.0, min(hz, 10_000.0))
+        self.include_idle = include_idle
+        self.stacks: Counter[str] = Counter()
+        self.samples  = 0
+        self.duration = 0.0
+        self._stop    = threading.Event()
+        self._thread  = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self) -> "SamplingProfiler":
+        self._started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+        return self
+
+    def _run(self) -> None:
+        own   = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if not self.include_idle and (code.co_filename.rsplit("/", 1)[-1], code.co_name) in _IDLE_LEAVES:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """flamegraph.pl / speedscope input: one ``stack count`` line per distinct stack."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# ── Per-request sampling ──────────────────────────────────────────────────────
+
+_request_counter = itertools.count(1)
+
+
+@asynccontextmanager
+async def maybe_profile_request(label: str) -> AsyncIterator[None]:
+    """Profile the enclosed block on every PROFILE_EVERY_N-th call; otherwise a no-op."""
+    if PROFILE_EVERY_N <= 0 or next(_request_counter) % PROFILE_EVERY_N:
+        yield
+        return
+
+    profiler = SamplingProfiler(PROFILE_REQUEST_HZ).start()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        out_dir = Path(PROFILE_DIR)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        path = out_dir / f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{time.perf_counter_ns() % 10**6:06d}.folded"
+        path.write_text(profiler.collapsed(), encoding="utf-8")
+        logger.info("Request profile: %d samples over %.1f ms → %s",
+                    profiler.samples, profiler.duration * 1000, path)
+
+
+def sampled_request_profile(label: str):
+    """Route dependency (``dependencies=[Depends(...)]``) wrapping ``maybe_profile_request``."""
+    async def dependency() -> AsyncIterator[None]:
+        async with maybe_profile_request(label):
+            yield
+    return dependency
@@ -0,0 +1,347 @@
+"""
+Shared-Memory Inference Workers
+===============================
+Multi-process inference backend. N worker processes each hold their own copy
+of the model; the API process decodes + resizes uploads straight into a ring
+of ``multiprocessing.shared_memory`` slots and only passes the slot index
+through the task queue, so no tensor is ever pickled.
+
+Layout of the two shared blocks (``slots`` = ring size):
+  inputs  : float32 (slots, 224, 224, 3)  — written by the API process
+  outputs : float32 (slots, 38)           — written by the worker
+
+Enable with SHM_WORKERS=N (or ``load_predictor(path, workers=N)``).
+
+A request waits at most SHM_RESULT_TIMEOUT seconds for its result. If a
+worker process dies, every pending request fails and the predictor reports
+itself broken (like a ``BrokenProcessPool``) — the slot a dead worker was
+holding can't be trusted, and neither can a task queue it may have died
+reading from.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+from typing import Any
+
+import numpy as np
+
+from services.metrics import observe_batch, record_stage
+from services.predictor import CLASS_NAMES, IMG_SIZE, format_prediction, preprocess_array_into, preprocess_into
+from services.synthetic import SYNTHETIC_MODEL
+
+logger = logging.getLogger(__name__)
+
+SHM_WORKERS          = int(os.environ.get("SHM_WORKERS", "0"))
+SHM_SLOTS_PER_WORKER = int(os.environ.get("SHM_SLOTS_PER_WORKER", "4"))
+WORKER_MAX_BATCH     = int(os.environ.get("SHM_WORKER_MAX_BATCH", "8"))
+STARTUP_TIMEOUT_S    = float(os.environ.get("SHM_STARTUP_TIMEOUT", "300"))
+RESULT_TIMEOUT_S     = float(os.environ.get("SHM_RESULT_TIMEOUT", "60"))
+
+_LIVENESS_CHECK_S = 1.0        # how often the result listener checks the workers are alive
+_IDLE             = object()   # listener: no result arrived within _LIVENESS_CHECK_S
+
+_INPUT_SHAPE = (*IMG_SIZE, 3)
+
+
+# ── Worker process ────────────────────────────────────────────────────────────
+
+def _worker_main(
+    worker_id: int,
+    model_path: str,
+    in_name: str,
+    out_name: str,
+    slots: int,
+    tasks: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+) -> None:
+    from services.predictor import load_predictor
+
+    in_shm  = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    inputs  = np.ndarray((slots, *_INPUT_SHAPE), dtype=np.float32, buffer=in_shm.buf)
+    outputs = np.ndarray((slots, len(CLASS_NAMES)), dtype=np.float32, buffer=out_shm.buf)
+
+    predictor = load_predictor(model_path, batching=False, workers=0)
+    if hasattr(predictor, "warmup"):
+        from services.batching import batch_buckets
+        predictor.warmup(batch_buckets(WORKER_MAX_BATCH))
+    # Ready = has a tensor path (a real model, or the synthetic load-test stand-in)
+    # whose input matches the ring, which is sized before any model is loaded.
+    if not hasattr(predictor, "predict_tensor"):
+        problem = "the model could not be loaded"
+    elif tuple(predictor.input_size) != IMG_SIZE:
+        problem = (f"the model takes {predictor.input_size[0]}×{predictor.input_size[1]} input but the "
+                   f"shared-memory ring holds {IMG_SIZE[0]}×{IMG_SIZE[1]} images")
+    else:
+        problem = None
+    results.put(("ready", worker_id, problem))
+
+    try:
+        while True:
+            slot = tasks.get()
+            if slot is None:
+                break
+
+            # Drain whatever else is already waiting so this worker runs a small batch.
+            batch = [slot]
+            stop  = False
+            while len(batch) < WORKER_MAX_BATCH:
+                try:
+                    nxt = tasks.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                batch.append(nxt)
+
+            start = time.perf_counter()
+            try:
+                outputs[batch] = predictor.predict_tensor(inputs[batch])
+                error = None
+            except Exception as exc:
+                error = f"{type(exc).__name__}: {exc}"
+            busy = time.perf_counter() - start
+            results.put(("done", worker_id, batch, error, busy))
+
+            if stop:
+                break
+    finally:
+        del inputs, outputs
+        in_shm.close()
+        out_shm.close()
+
+
+# ── API-process side ──────────────────────────────────────────────────────────
+
+class SharedMemoryPredictor:
+    """
+    Sync predictor backed by a pool of worker processes. ``predict`` may be
+    called from many threads at once (e.g. the InferencePool thread executor);
+    each call leases one ring slot for the lifetime of the request.
+    """
+
+    def __init__(self, model_path: str, workers: int, slots_per_worker: int = 4):
+        ctx = multiprocessing.get_context("spawn")
+
+        self.workers = max(1, workers)
+        self.slots   = self.workers * max(1, slots_per_worker)
+
+        self._in_shm  = shared_memory.SharedMemory(
+            create=True, size=self.slots * int(np.prod(_INPUT_SHAPE)) * 4,
+        )
+        self._out_shm = shared_memory.SharedMemory(
+            create=True, size=self.slots * len(CLASS_NAMES) * 4,
+        )
+        self._inputs  = np.ndarray((self.slots, *_INPUT_SHAPE), dtype=np.float32, buffer=self._in_shm.buf)
+        self._outputs = np.ndarray((self.slots, len(CLASS_NAMES)), dtype=np.float32, buffer=self._out_shm.buf)
+
+        self._free: queue.Queue[int] = queue.Queue()
+        for slot in range(self.slots):
+            self._free.put(slot)
+        self._pending: dict[int, Future] = {}
+        self._abandoned: set[int] = set()   # timed-out slots a worker may still write to
+        self._slot_lock = threading.Lock()
+        self._broken: str | None = None
+        self._closing = False
+
+        self._tasks   = ctx.Queue()
+        self._results = ctx.Queue()
+        self._procs   = [
+            ctx.Process(
+                target=_worker_main,
+                args=(i, model_path, self._in_shm.name, self._out_shm.name,
+                      self.slots, self._tasks, self._results),
+                name=f"inference-worker-{i}",
+                daemon=True,
+            )
+            for i in range(self.workers)
+        ]
+        for proc in self._procs:
+            proc.start()
+
+        # Block until every worker has its model in memory.
+        try:
+            loaded = [self._results.get(timeout=STARTUP_TIMEOUT_S) for _ in self._procs]
+        except queue.Empty:
+            loaded = []
+        problems = {problem for _, _, problem in loaded if problem}
+        if len(loaded) < self.workers or problems:
+            self._shutdown_workers()
+            self._release_shm()
+            raise RuntimeError(f"inference workers not ready: {'; '.join(problems) or 'startup timed out'}")
+        self.model_loaded = model_path != SYNTHETIC_MODEL
+
+        self._started    = time.perf_counter()
+        self._busy       = [0.0] * self.workers
+        self._served     = [0] * self.workers
+        self._stats_lock = threading.Lock()
+        self._listener   = threading.Thread(
+            target=self._collect, name="shm-result-listener", daemon=True,
+        )
+        self._listener.start()
+        logger.info("Shared-memory inference: %d worker process(es), %d ring slots.",
+                    self.workers, self.slots)
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    def predict(self, image_bytes: bytes) -> dict[str, Any]:
+        return self._predict_one(preprocess_into, image_bytes)
+
+    def predict_array(self, frame: np.ndarray, bgr: bool = True) -> dict[str, Any]:
+        """Classify a raw uint8 (H, W, 3) frame — resized straight into its ring slot."""
+        return self._predict_one(lambda src, out: preprocess_array_into(src, out, bgr), frame)
+
+    def _predict_one(self, preprocess, source) -> dict[str, Any]:
+        if self._broken:
+            raise RuntimeError(f"Shared-memory inference is broken — {self._broken}")
+        try:
+            slot = self._free.get(timeout=RESULT_TIMEOUT_S)
+        except queue.Empty:
+            raise TimeoutError(f"No free shared-memory slot within {RESULT_TIMEOUT_S:g} s") from None
+        reclaim = True
+        try:
+            started = time.perf_counter()
+            preprocess(source, self._inputs[slot])
+            decoded = time.perf_counter()
+            future: Future = Future()
+            with self._slot_lock:
+                if self._broken:
+                    raise RuntimeError(f"Shared-memory inference is broken — {self._broken}")
+                self._pending[slot] = future
+            self._tasks.put(slot)
+            try:
+                probs = future.result(timeout=RESULT_TIMEOUT_S)
+            except FutureTimeout:
+                with self._slot_lock:
+                    if not future.done():
+                        # A worker may still write this slot; _collect frees it when the result lands.
+                        self._pending.pop(slot, None)
+                        self._abandoned.add(slot)
+                        reclaim = False
+                if reclaim:
+                    probs = future.result()
+                else:
+                    raise TimeoutError(f"No inference result within {RESULT_TIMEOUT_S:g} s")
+            record_stage("preprocess", decoded - started)
+            record_stage("inference", time.perf_counter() - decoded)   # worker queue included
+        finally:
+            if reclaim:
+                self._pending.pop(slot, None)
+                self._free.put(slot)
+        return format_prediction(probs)
+
+    def stats(self) -> dict[str, Any]:
+        elapsed = max(time.perf_counter() - self._started, 1e-9)
+        with self._stats_lock:
+            per_worker = [
+                {
+                    "worker":      i,
+                    "alive":       proc.is_alive(),
+                    "images":      self._served[i],
+                    "busy_s":      round(self._busy[i], 3),
+                    "utilization": round(self._busy[i] / elapsed, 4),
+                }
+                for i, proc in enumerate(self._procs)
+            ]
+        return {
+            "workers":      per_worker,
+            "ring_slots":   self.slots,
+            "slots_in_use": self.slots - self._free.qsize(),
+            "broken":       self._broken,
+        }
+
+    def close(self) -> None:
+        self._closing = True
+        self._shutdown_workers()
+        if self._listener.is_alive():
+            self._results.put(None)
+            self._listener.join(timeout=5)
+        # A worker terminated mid-put may have died holding a queue's write lock;
+        # don't let interpreter exit wait on a feeder thread that can never finish.
+        self._tasks.cancel_join_thread()
+        self._results.cancel_join_thread()
+        self._release_shm()
+
+    def _shutdown_workers(self) -> None:
+        for _ in self._procs:
+            self._tasks.put(None)
+        for proc in self._procs:
+            proc.join(timeout=10)
+            if proc.is_alive():
+                proc.terminate()
+
+    def _release_shm(self) -> None:
+        del self._inputs, self._outputs
+        for shm in (self._in_shm, self._out_shm):
+            shm.close()
+            shm.unlink()
+
+    # ── Result listener thread ────────────────────────────────────────────────
+
+    def _collect(self) -> None:
+        checked = time.monotonic()
+        while True:
+            try:
+                msg = self._results.get(timeout=_LIVENESS_CHECK_S)
+            except queue.Empty:
+                msg = _IDLE
+            if msg is None:
+                return
+
+            now = time.monotonic()
+            if now - checked >= _LIVENESS_CHECK_S:
+                checked = now
+                dead = [proc.name for proc in self._procs if not proc.is_alive()]
+                if dead and not self._closing:
+                    self._fail_all(f"worker process died: {', '.join(dead)}")
+                    return
+            if msg is _IDLE:
+                continue
+            _, worker_id, batch, error, busy = msg
+
+            with self._stats_lock:
+                self._busy[worker_id]   += busy
+                self._served[worker_id] += len(batch)
+            observe_batch(len(batch), busy)
+
+            for slot in batch:
+                # Under the lock, so a request timing out either sees its result or leaves
+                # the slot in _abandoned for this loop to free — never neither.
+                with self._slot_lock:
+                    if slot in self._abandoned:
+                        self._abandoned.discard(slot)
+                        self._free.put(slot)   # its request already timed out
+                        continue
+                    future = self._pending.get(slot)
+                    if future is None:
+                        continue
+                    if error is not None:
+                        future.set_exception(RuntimeError(f"Worker {worker_id} inference failed — {error}"))
+                    else:
+                        future.set_result(self._outputs[slot].copy())
+
+    def _fail_all(self, reason: str) -> None:
+        """A worker died: stop the rest, fail every waiting request and free every slot."""
+        for proc in self._procs:
+            if proc.is_alive():
+                proc.terminate()
+            proc.join(timeout=5)
+        with self._slot_lock:
+            self._broken = reason
+            pending, self._pending = self._pending, {}
+            abandoned, self._abandoned = self._abandoned, set()
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(RuntimeError(f"Shared-memory inference is broken — {reason}"))
+        logger.error("Shared-memory inference: %s — failing %d pending request(s).", reason, len(pending))
+        for slot in abandoned:
+            self._free.put(slot)   # owners of pending slots return theirs as their requests fail
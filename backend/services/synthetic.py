@@ -0,0 +1,150 @@
+"""
+Synthetic Predictor (load testing)
+==================================
+A model stand-in for capacity planning: exercises the full API stack —
+decode, tensor pool, micro-batching, executors, shm workers — with a
+realistic latency profile and plausible softmax output, but no model file.
+
+Enable with ``MODEL_PATH=synthetic``. Env vars:
+  SYNTHETIC_LATENCY      per-batch latency model (default "lognormal:25,0.35")
+                           fixed:<ms>
+                           lognormal:<median_ms>,<sigma>
+                           replay:<file.json>   — samples drawn from recorded latencies:
+                                                  a JSON list of ms values, or {"<ms>": count, ...}
+  SYNTHETIC_BATCH_SCALE  extra cost of each additional image in a batch, as a
+                         fraction of the single-image latency (default 0.15):
+                           latency(n) = sample × (1 + (n − 1) × scale)
+  SYNTHETIC_SEED         RNG seed (default 0)
+
+The latency is spent in ``time.sleep``, which releases the GIL the same way
+TensorFlow / ONNX Runtime kernels do, so thread-level concurrency behaves like
+a real backend.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from services.predictor import CLASS_NAMES, TensorPredictor
+
+SYNTHETIC_MODEL       = "synthetic"
+SYNTHETIC_LATENCY     = os.environ.get("SYNTHETIC_LATENCY", "lognormal:25,0.35")
+SYNTHETIC_BATCH_SCALE = float(os.environ.get("SYNTHETIC_BATCH_SCALE", "0.15"))
+SYNTHETIC_SEED        = int(os.environ.get("SYNTHETIC_SEED", "0"))
+
+
+# ── Latency models ────────────────────────────────────────────────────────────
+
+class LatencyModel:
+    """Draws single-image latencies in milliseconds from ``rng``."""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, _, args = spec.partition(":")
+        self.kind = kind.strip().lower()
+
+        if self.kind == "fixed":
+            self._fixed = float(args)
+        elif self.kind == "lognormal":
+            median, _, sigma = args.partition(",")
+            self._mu    = math.log(float(median))
+            self._sigma = float(sigma or 0.35)
+        elif self.kind == "replay":
+            samples = json.loads(Path(args).read_text(encoding="utf-8"))
+            if isinstance(samples, dict):
+                values  = np.array([float(k) for k in samples], dtype=np.float64)
+                weights = np.array([float(v) for v in samples.values()], dtype=np.float64)
+            else:
+                values  = np.asarray(samples, dtype=np.float64)
+                weights = np.ones_like(values)
+            if not len(values):
+                raise ValueError(f"Latency replay file '{args}' has no samples")
+            self._values = values
+            self._cdf    = np.cumsum(weights) / weights.sum()
+        else:
+            raise ValueError(
+                f"Unknown SYNTHETIC_LATENCY '{spec}' (expected fixed:, lognormal: or replay:)"
+            )
+
+    def sample(self, rng: np.random.Generator) -> float:
+        if self.kind == "fixed":
+            return self._fixed
+        if self.kind == "lognormal":
+            return float(rng.lognormal(self._mu, self._sigma))
+        idx = int(np.searchsorted(self._cdf, rng.random(), side="right"))
+        return float(self._values[min(idx, len(self._values) - 1)])
+
+
+# ── Predictor ─────────────────────────────────────────────────────────────────
+
+class SyntheticPredictor(TensorPredictor):
+    """TensorPredictor with simulated latency and deterministic, peaked softmax rows."""
+
+    model_loaded = False   # /health must not claim a real model is serving
+
+    def __init__(
+        self,
+        latency: LatencyModel,
+        batch_scale: float = SYNTHETIC_BATCH_SCALE,
+        seed: int = SYNTHETIC_SEED,
+    ):
+        self.latency     = latency
+        self.batch_scale = max(0.0, batch_scale)
+        self._rng  = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+        n = len(CLASS_NAMES)
+        table_rng = np.random.default_rng(seed)
+        # Row c: how the non-top-1 probability mass is spread when class c wins.
+        spread = table_rng.dirichlet(np.full(n, 0.3), size=n).astype(np.float32)
+        np.fill_diagonal(spread, 0.0)
+        self._spread = spread / spread.sum(axis=1, keepdims=True)
+        self._confidence = table_rng.uniform(0.55, 0.99, size=n).astype(np.float32)
+
+        self._batches = 0
+        self._images  = 0
+        self._slept_s = 0.0
+
+    def predict_tensor(self, batch: np.ndarray) -> np.ndarray:
+        n = len(batch)
+        # Same image → same class: fingerprint a sparse grid of pixels.
+        fingerprint = np.abs(batch[:, ::37, ::37, :].reshape(n, -1)).sum(axis=1)
+        classes     = (fingerprint * 1000).astype(np.int64) % len(CLASS_NAMES)
+
+        with self._lock:
+            delay_ms = self.latency.sample(self._rng) * (1 + (n - 1) * self.batch_scale)
+            jitter   = self._rng.uniform(-0.03, 0.03, size=n).astype(np.float32)
+
+        conf  = np.clip(self._confidence[classes] + jitter, 0.05, 0.999)
+        probs = self._spread[classes] * (1 - conf)[:, None]
+        probs[np.arange(n), classes] = conf
+
+        time.sleep(delay_ms / 1000)
+        with self._lock:
+            self._batches += 1
+            self._images  += n
+            self._slept_s += delay_ms / 1000
+        return probs
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "synthetic_latency":       self.latency.spec,
+                "synthetic_batch_scale":   self.batch_scale,
+                "synthetic_batches":       self._batches,
+                "synthetic_images":        self._images,
+                "synthetic_mean_batch_ms": round(self._slept_s / self._batches * 1000, 2) if self._batches else 0.0,
+            }
+
+
+def create_synthetic_predictor() -> SyntheticPredictor:
+    """Build the predictor configured by the SYNTHETIC_* env vars."""
+    return SyntheticPredictor(LatencyModel(SYNTHETIC_LATENCY), SYNTHETIC_BATCH_SCALE, SYNTHETIC_SEED)
@@ -0,0 +1,69 @@
+"""
+Tensor Buffer Pool
+==================
+Preallocated float32 image slots that the preprocessing step decodes straight
+into, plus a preallocated batch buffer the micro-batcher gathers them into.
+
+At high QPS this replaces three fresh ~600 KB arrays per request (float cast,
+scale/shift result, expand_dims) with writes into memory that is allocated once
+at startup, so the allocator and GC see no per-request churn.
+"""
+
+from __future__ import annotations
+
+import queue
+
+import numpy as np
+
+from services.predictor import IMG_SIZE, preprocess_array_into, preprocess_into
+
+
+class TensorPool:
+    """
+    Fixed ring of ``capacity`` (H, W, 3) float32 slots — ``size`` is the
+    model's input size (224×224 unless the model says otherwise).
+
+    ``lease`` blocks when every slot is in use, which doubles as back-pressure
+    on decoding when the model falls behind.
+    """
+
+    def __init__(self, capacity: int, size: tuple[int, int] = IMG_SIZE):
+        self.capacity = max(1, capacity)
+        self.slots    = np.empty((self.capacity, *size, 3), dtype=np.float32)
+        self._free: queue.Queue[int] = queue.Queue()
+        for slot in range(self.capacity):
+            self._free.put(slot)
+
+    def lease(self) -> int:
+        return self._free.get()
+
+    def release(self, slot: int) -> None:
+        self._free.put(slot)
+
+    def fill(self, image_bytes: bytes) -> int:
+        """Lease a slot and preprocess ``image_bytes`` into it; returns the slot index."""
+        return self._fill(preprocess_into, image_bytes)
+
+    def fill_array(self, frame: np.ndarray, bgr: bool = True) -> int:
+        """``fill`` for a raw uint8 (H, W, 3) frame."""
+        return self._fill(lambda src, out: preprocess_array_into(src, out, bgr), frame)
+
+    def _fill(self, preprocess, source) -> int:
+        slot = self.lease()
+        try:
+            preprocess(source, self.slots[slot])
+        except Exception:
+            self.release(slot)
+            raise
+        return slot
+
+    def gather(self, slots: list[int], out: np.ndarray) -> np.ndarray:
+        """Copy ``slots`` into the leading rows of ``out`` (no allocation); returns that view."""
+        view = out[:len(slots)]
+        # mode="clip" lets numpy write into ``out`` directly ("raise" buffers it first).
+        np.take(self.slots, slots, axis=0, out=view, mode="clip")
+        return view
+
+    @property
+    def in_use(self) -> int:
+        return self.capacity - self._free.qsize()
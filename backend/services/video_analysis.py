@@ -0,0 +1,343 @@
+"""
+Video Analysis (headless)
+=========================
+Classifies a recorded walk-through video or a live RTSP / HTTP stream and
+writes a per-timestamp detection timeline — no window, no GUI.
+
+Pipeline:
+  decode thread: cv2.VideoCapture → sample (scene change or stride)
+                 → resize + scale straight into a model-input tensor
+  main thread:   fills batches → predictor.predict_tensor → timeline rows
+
+Decoding and resizing overlap with inference (OpenCV and PIL release the GIL),
+and sampled frames are classified in full batches, so the model runs at its
+batched throughput rather than one frame at a time.
+
+Sampling (``--sample``):
+  scene   classify a frame when it differs from the last classified one
+          (services.video_pipeline.ChangeDetector) or ``max_stale_s`` of video
+          time has passed — one row per new view, not per frame (default)
+  stride  classify every ``stride``-th frame (default: one per second of video)
+
+For files the decoder waits for the model; for live streams it never blocks
+the capture — sampled frames the model can't keep up with are dropped and
+counted.
+
+Output is CSV, or JSON (``.json``: run metadata, every detection and the
+timeline collapsed into same-class segments). Stop a live stream with Ctrl-C
+or ``--max-seconds``; the output is completed either way.
+
+Usage:
+  python main.py --video walkthrough.mp4 --out timeline.csv
+  python main.py --video rtsp://10.0.0.7:8554/greenhouse --out timeline.json --max-seconds 600
+  python main.py --video walkthrough.mp4 --sample stride --stride 15 --batch 64
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+import logging
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:   # only analyze_video needs it; main.py reports the missing package
+    cv2 = None
+
+from services.predictor import IMG_SIZE, format_prediction, load_predictor, preprocess_array
+from services.treatment_db import get_treatment
+from services.video_pipeline import CHANGE_THRESHOLD, MAX_STALE_S, ChangeDetector
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = [
+    "frame", "timestamp_s", "timecode", "trigger", "class_name", "plant", "condition",
+    "is_healthy", "confidence", "severity_risk", "top5",
+]
+
+_LIVE_SCHEMES = ("rtsp://", "rtsps://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+_END = object()   # decoder → main thread: no more frames
+
+
+def _timecode(seconds: float) -> str:
+    minutes, secs = divmod(seconds, 60)
+    hours, minutes = divmod(int(minutes), 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:06.3f}"
+
+
+# ── Decode / sample thread ────────────────────────────────────────────────────
+
+class _Decoder(threading.Thread):
+    """
+    Reads ``source`` and queues (frame_index, timestamp_s, trigger, payload)
+    for sampled frames — payload is a (1, H, W, 3) model tensor, or the raw
+    frame when ``size`` is None (predictors without a tensor path).
+
+    The decoder owns ``cap`` and releases it when it exits: releasing it from
+    another thread while ``cap.read()`` is still running is undefined.
+    """
+
+    def __init__(self, cap: Any, out: queue.Queue, live: bool, size: tuple[int, int] | None,
+                 detector: ChangeDetector | None, stride: int, max_seconds: float | None):
+        super().__init__(name="video-decoder", daemon=True)
+        self.cap         = cap
+        self.out         = out
+        self.live        = live
+        self.size        = size
+        self.detector    = detector
+        self.stride      = max(1, stride)
+        self.max_seconds = max_seconds
+        self.fps         = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        self.decoded     = 0
+        self.sampled     = 0
+        self.dropped     = 0
+        self.error: Exception | None = None
+        self._stopping   = threading.Event()
+        self._first_at: float | None = None   # live sources: clock starts at the first frame
+
+    def _timestamp(self, index: int) -> float:
+        if self.live:
+            now = time.monotonic()
+            if self._first_at is None:
+                self._first_at = now
+            return now - self._first_at
+        position_ms = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+        if position_ms and position_ms > 0:
+            return position_ms / 1000
+        return index / self.fps if self.fps else float(index)
+
+    def _trigger(self, index: int, timestamp: float, frame: np.ndarray) -> str | None:
+        if self.detector is None:
+            return "stride" if index % self.stride == 0 else None
+        if index == 0:
+            self.detector.should_infer(frame, timestamp)
+            return "first"
+        if not self.detector.should_infer(frame, timestamp):
+            return None
+        return "scene" if self.detector.score >= self.detector.threshold else "stale"
+
+    def run(self) -> None:
+        try:
+            index = 0
+            while not self._stopping.is_set():
+                ok, frame = self.cap.read()
+                if not ok:
+                    break
+                timestamp = self._timestamp(index)
+                if self.max_seconds is not None and timestamp > self.max_seconds:
+                    break
+                self.decoded += 1
+                trigger = self._trigger(index, timestamp, frame)
+                index += 1
+                if trigger is None:
+                    continue
+
+                payload = preprocess_array(frame, self.size) if self.size else frame
+                item = (index - 1, timestamp, trigger, payload)
+                self.sampled += 1
+                if not self.live:
+                    if not self._put(item):   # file: wait for the model
+                        break
+                    continue
+                try:
+                    self.out.put_nowait(item)
+                except queue.Full:
+                    self.dropped += 1
+        except Exception as exc:
+            self.error = exc
+        finally:
+            self.cap.release()
+            self._put(_END)
+
+    def _put(self, item: Any) -> bool:
+        """Blocking put that gives up once ``stop`` is called (nobody is reading then)."""
+        while not self._stopping.is_set():
+            try:
+                self.out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+
+# ── Output ────────────────────────────────────────────────────────────────────
+
+def _row(frame: int, timestamp: float, trigger: str, raw: dict[str, Any]) -> dict[str, Any]:
+    treatment = get_treatment(raw["class_name"]) or {}
+    return {
+        "frame":         frame,
+        "timestamp_s":   round(timestamp, 3),
+        "timecode":      _timecode(timestamp),
+        "trigger":       trigger,
+        "class_name":    raw["class_name"],
+        "plant":         treatment.get("plant"),
+        "condition":     treatment.get("condition"),
+        "is_healthy":    treatment.get("is_healthy"),
+        "confidence":    round(raw["confidence"], 4),
+        "severity_risk": treatment.get("severity_risk"),
+        "top5":          raw.get("top5", []),
+    }
+
+
+def _segments(rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Collapse consecutive same-class detections into (start, end, class) spans."""
+    segments: list[dict[str, Any]] = []
+    for row in rows:
+        last = segments[-1] if segments else None
+        if last and last["class_name"] == row["class_name"]:
+            last["end_s"]          = row["timestamp_s"]
+            last["detections"]    += 1
+            last["max_confidence"] = max(last["max_confidence"], row["confidence"])
+            continue
+        segments.append({
+            "start_s":        row["timestamp_s"],
+            "end_s":          row["timestamp_s"],
+            "class_name":     row["class_name"],
+            "is_healthy":     row["is_healthy"],
+            "detections":     1,
+            "max_confidence": row["confidence"],
+        })
+    return segments
+
+
+class _TimelineSink:
+    """CSV rows are streamed as they arrive; JSON is written once at the end."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.json = path.suffix.lower() == ".json"
+        self.rows: list[dict[str, Any]] = []
+        if not self.json:
+            self._fh = open(path, "w", newline="", encoding="utf-8")
+            self._writer = csv.DictWriter(self._fh, fieldnames=COLUMNS)
+            self._writer.writeheader()
+
+    def write(self, rows: list[dict[str, Any]]) -> None:
+        self.rows.extend(rows)
+        if not self.json:
+            self._writer.writerows({**row, "top5": json.dumps(row["top5"])} for row in rows)
+            self._fh.flush()
+
+    def close(self, meta: dict[str, Any]) -> None:
+        if not self.json:
+            self._fh.close()
+            return
+        document = {"meta": meta, "segments": _segments(self.rows), "detections": self.rows}
+        self.path.write_text(json.dumps(document, indent=2) + "\n", encoding="utf-8")
+
+
+# ── Analyzer ──────────────────────────────────────────────────────────────────
+
+def analyze_video(
+    source: str,
+    output: str,
+    model_path: str,
+    sample: str = "scene",
+    stride: int | None = None,
+    batch_size: int = 32,
+    change_threshold: float = CHANGE_THRESHOLD,
+    max_stale_s: float = MAX_STALE_S,
+    max_seconds: float | None = None,
+) -> dict[str, Any]:
+    """Classify sampled frames of ``source`` (file path or stream URL); returns a run summary."""
+    if cv2 is None:
+        raise RuntimeError("opencv-python is not installed (pip install opencv-python)")
+    if sample not in ("scene", "stride"):
+        raise ValueError(f"Unknown sampling mode '{sample}' (expected 'scene' or 'stride')")
+    live = source.lower().startswith(_LIVE_SCHEMES)
+    if not live and not Path(source).exists():
+        raise FileNotFoundError(f"Video file not found: {source}")
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video source {source}")
+
+    predictor   = load_predictor(model_path, batching=False, workers=0)
+    tensor_path = hasattr(predictor, "predict_tensor")
+    size        = getattr(predictor, "input_size", IMG_SIZE) if tensor_path else None
+    fps         = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    detector    = ChangeDetector(change_threshold, max_stale_s) if sample == "scene" else None
+    stride      = stride or max(1, round(fps) if fps else 1)
+
+    frames: queue.Queue = queue.Queue(maxsize=batch_size * 4)
+    decoder = _Decoder(cap, frames, live, size, detector, stride, max_seconds)
+    buffer  = np.empty((batch_size, *(size or IMG_SIZE), 3), dtype=np.float32)
+    sink    = _TimelineSink(Path(output))
+
+    logger.info("Video analysis: %s (%s, %.1f fps) | sampling %s | batch %d → %s",
+                source, "live" if live else "file", fps,
+                f"scene change ≥ {change_threshold:g} / {max_stale_s:g} s" if detector else f"every {stride} frames",
+                batch_size, output)
+
+    classified = 0
+    started = last_log = time.perf_counter()
+    interrupted = False
+    decoder.start()
+    try:
+        done = False
+        while not done:
+            batch = [frames.get()]
+            while len(batch) < batch_size and batch[-1] is not _END:
+                try:
+                    batch.append(frames.get(timeout=0.05 if live else None))
+                except queue.Empty:
+                    break   # live: don't hold detections back waiting for a full batch
+            if batch[-1] is _END:
+                done = True
+                batch.pop()
+            if not batch:
+                continue
+
+            if tensor_path:
+                for slot, (_, _, _, tensor) in enumerate(batch):
+                    buffer[slot] = tensor[0]
+                probs = predictor.predict_tensor(buffer[:len(batch)])
+                raws  = [format_prediction(row) for row in probs]
+            else:
+                raws = [predictor.predict_array(frame) for _, _, _, frame in batch]
+            sink.write([_row(index, ts, trigger, raw) for (index, ts, trigger, _), raw in zip(batch, raws)])
+            classified += len(batch)
+
+            now = time.perf_counter()
+            if now - last_log >= 10:
+                logger.info("Decoded %d frames | classified %d | %.1f frames/s",
+                            decoder.decoded, classified, decoder.decoded / (now - started))
+                last_log = now
+    except KeyboardInterrupt:
+        interrupted = True
+        logger.info("Interrupted — writing the timeline so far.")
+    finally:
+        decoder.stop()
+        decoder.join(timeout=5)   # the decoder releases ``cap`` on its way out
+        seconds = time.perf_counter() - started
+        summary = {
+            "source":          source,
+            "live":            live,
+            "fps":             round(fps, 3),
+            "sampling":        sample,
+            "stride":          stride if detector is None else None,
+            "frames_decoded":  decoder.decoded,
+            "frames_sampled":  decoder.sampled,
+            "frames_dropped":  decoder.dropped,
+            "classified":      classified,
+            "seconds":         round(seconds, 2),
+            "decode_fps":      round(decoder.decoded / seconds, 1) if seconds else 0.0,
+            "interrupted":     interrupted,
+        }
+        sink.close(summary)
+        if hasattr(predictor, "close"):
+            predictor.close()
+
+    if decoder.error is not None:
+        logger.error("Video decoding stopped early: %s", decoder.error)
+        summary["error"] = str(decoder.error)
+    return summary
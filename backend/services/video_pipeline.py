@@ -0,0 +1,363 @@
+"""
+Live Video Pipeline
+===================
+Decouples webcam capture, model inference and on-screen rendering so a slow
+model never stalls the preview (see ``run_local_webcam`` in main.py):
+
+  capture thread ──► frames slot ──► inference worker ──► results slot
+                          │                                    │
+                          └───────► render loop (main thread) ◄┘
+
+Both slots are newest-wins: a reader that falls behind skips straight to the
+latest item instead of working through a backlog. The inference worker
+therefore always classifies the freshest frame (results are never more than
+one inference old), and the render loop draws every captured frame at camera
+rate with whatever result is newest. Skipped items are counted as drops.
+
+With a ``ChangeDetector`` the worker also leaves frames alone while the scene
+is static: a leaf held still in front of the camera is classified once, then
+again only when the picture changes or ``max_stale_s`` has passed.
+
+A ``TemporalSmoother`` turns the flickering per-frame output into a steady
+reading (EMA over the softmax vectors, hysteresis on the displayed class);
+once that reading is confident the worker drops to ``confident_fps``.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+import numpy as np
+from PIL import Image
+
+from services.predictor import CLASS_NAMES
+
+logger = logging.getLogger(__name__)
+
+CHANGE_THRESHOLD = 0.04   # ChangeDetector score that counts as a new scene
+MAX_STALE_S      = 2.0    # re-classify an unchanged scene at least this often
+
+SMOOTHING_ALPHA  = 0.35   # EMA weight of the newest softmax vector
+SWITCH_MARGIN    = 0.10   # how far a new class must lead the shown one to replace it
+CONFIDENT_PROB   = 0.80   # smoothed probability that counts as a stable diagnosis
+CONFIDENT_FPS    = 3.0    # inference rate once the diagnosis is stable
+
+
+class LatestSlot:
+    """
+    Single-item, newest-wins channel for any number of readers.
+
+    ``put`` replaces the item and bumps ``seq``; readers remember the ``seq``
+    they last consumed, so the gap to the next one they read is exactly how
+    many items they missed.
+    """
+
+    def __init__(self) -> None:
+        self._cond  = threading.Condition()
+        self._item: Any = None
+        self.seq    = 0
+        self.closed = False
+
+    def put(self, item: Any) -> int:
+        with self._cond:
+            self._item = item
+            self.seq  += 1
+            self._cond.notify_all()
+            return self.seq
+
+    def close(self) -> None:
+        """Wake every waiting reader; no more items will arrive."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def latest(self) -> tuple[int, Any]:
+        with self._cond:
+            return self.seq, self._item
+
+    def wait_newer(self, seq: int, timeout: float | None = None) -> tuple[int, Any]:
+        """Block until an item newer than ``seq`` exists (or close / timeout); returns the latest."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > seq or self.closed, timeout)
+            return self.seq, self._item
+
+
+class RateMeter:
+    """Events per second, refreshed once per ``window`` — the HUD's FPS counters."""
+
+    def __init__(self, window: float = 1.0) -> None:
+        self.window = window
+        self.rate   = 0.0
+        self._count = 0
+        self._start = time.monotonic()
+
+    def tick(self) -> None:
+        self._count += 1
+        now = time.monotonic()
+        if now - self._start >= self.window:
+            self.rate   = self._count / (now - self._start)
+            self._count = 0
+            self._start = now
+
+
+# ── Capture ───────────────────────────────────────────────────────────────────
+
+class CaptureThread(threading.Thread):
+    """Reads ``cap`` as fast as the camera delivers and publishes (captured_at, frame).
+
+    The thread owns ``cap`` and releases it when it exits: releasing it from
+    another thread while ``read()`` is in flight is undefined in OpenCV.
+    """
+
+    def __init__(self, cap: Any, frames: LatestSlot):
+        super().__init__(name="video-capture", daemon=True)
+        self.cap       = cap
+        self.frames    = frames
+        self.meter     = RateMeter()
+        self.failed    = False
+        self._stopping = threading.Event()
+
+    def run(self) -> None:
+        try:
+            while not self._stopping.is_set():
+                ok, frame = self.cap.read()
+                if not ok:
+                    self.failed = not self._stopping.is_set()
+                    break
+                self.frames.put((time.monotonic(), frame))
+                self.meter.tick()
+        finally:
+            self.cap.release()
+            self.frames.close()
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+
+# ── Change detection ──────────────────────────────────────────────────────────
+
+class ChangeDetector:
+    """
+    Decides whether a frame differs enough from the last classified one to be
+    worth a model run. The (OpenCV BGR) frame is box-filtered down to a 32×24
+    grey thumbnail (about a millisecond for 640×480) and scored against the
+    thumbnail of the last classified frame as the larger of:
+
+      - mean absolute pixel difference / 255   — movement, a new leaf
+      - total-variation distance of 16-bin
+        luminance histograms                     — lighting / exposure shifts
+
+    Comparing against the last *classified* frame rather than the previous
+    one means slow drift still adds up to a trigger.
+    """
+
+    THUMB_SIZE = (32, 24)
+    HIST_BINS  = 16
+    BGR_TO_L   = (0.114, 0.587, 0.299, 0)   # ITU-R 601 luma weights in B, G, R order
+
+    def __init__(self, threshold: float = CHANGE_THRESHOLD, max_stale_s: float = MAX_STALE_S):
+        self.threshold   = threshold
+        self.max_stale_s = max_stale_s
+        self.score       = 0.0
+        self._reference: tuple[np.ndarray, np.ndarray] | None = None
+        self._accepted_at = 0.0   # time of the last frame that went to the model
+
+    def _signature(self, frame: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        grey  = Image.fromarray(frame).convert("L", self.BGR_TO_L)   # weights BGR directly, no channel-swap copy
+        thumb = np.asarray(grey.resize(self.THUMB_SIZE, Image.BOX), dtype=np.int16)
+        hist  = np.bincount(((thumb * self.HIST_BINS) >> 8).ravel(), minlength=self.HIST_BINS) / thumb.size
+        return thumb, hist
+
+    def should_infer(self, frame: np.ndarray, now: float | None = None) -> bool:
+        """True (and ``frame`` becomes the new reference) when it should be classified."""
+        now = time.monotonic() if now is None else now
+        thumb, hist = self._signature(frame)
+        if self._reference is None:
+            self.score = 1.0
+        else:
+            ref_thumb, ref_hist = self._reference
+            self.score = max(
+                float(np.abs(thumb - ref_thumb).mean()) / 255,
+                float(np.abs(hist - ref_hist).sum()) / 2,
+            )
+        if self.score < self.threshold and now - self._accepted_at < self.max_stale_s:
+            return False
+        self._reference   = (thumb, hist)
+        self._accepted_at = now
+        return True
+
+
+# ── Temporal smoothing ────────────────────────────────────────────────────────
+
+_CLASS_INDEX = {name: i for i, name in enumerate(CLASS_NAMES)}
+
+
+@dataclass
+class SmoothedPrediction:
+    class_name: str       # displayed class (hysteresis applied)
+    confidence: float     # its smoothed probability
+    confident:  bool      # confidence ≥ CONFIDENT_PROB after at least ``min_updates`` frames
+
+
+class TemporalSmoother:
+    """
+    Exponential moving average over per-frame softmax vectors, with hysteresis
+    on the class it reports: the shown class only changes when another one's
+    smoothed probability leads it by ``switch_margin``, so two near-tied
+    classes can't flicker back and forth.
+
+    Predictors return the top-5 only; each update rebuilds the 38-class vector
+    from those and spreads the remaining mass evenly over the other classes
+    (for a softmax head the top 5 typically hold >99 % of it).
+    """
+
+    def __init__(
+        self,
+        alpha: float = SMOOTHING_ALPHA,
+        switch_margin: float = SWITCH_MARGIN,
+        confident_prob: float = CONFIDENT_PROB,
+        min_updates: int = 3,
+    ):
+        self.alpha          = min(max(alpha, 0.0), 1.0)
+        self.switch_margin  = switch_margin
+        self.confident_prob = confident_prob
+        self.min_updates    = min_updates
+        self.probs: np.ndarray | None = None
+        self.shown: int | None        = None
+        self.updates = 0
+
+    @staticmethod
+    def _vector(result: dict[str, Any]) -> np.ndarray:
+        top5  = [(_CLASS_INDEX[e["class"]], e["confidence"]) for e in result["top5"]]
+        rest  = max(0.0, 1.0 - sum(conf for _, conf in top5)) / (len(CLASS_NAMES) - len(top5))
+        probs = np.full(len(CLASS_NAMES), rest)
+        for idx, conf in top5:
+            probs[idx] = conf
+        return probs
+
+    def update(self, result: dict[str, Any]) -> SmoothedPrediction:
+        """Fold one predictor result dict into the average; returns the current reading."""
+        vector = self._vector(result)
+        self.probs = vector if self.probs is None else self.alpha * vector + (1 - self.alpha) * self.probs
+        self.updates += 1
+
+        leader = int(np.argmax(self.probs))
+        if self.shown is None or self.probs[leader] - self.probs[self.shown] > self.switch_margin:
+            self.shown = leader
+        return self.current()
+
+    def reset(self) -> None:
+        """Forget the average — the next update alone sets the reading."""
+        self.probs   = None
+        self.shown   = None
+        self.updates = 0
+
+    def current(self) -> SmoothedPrediction | None:
+        if self.shown is None:
+            return None
+        confidence = float(self.probs[self.shown])
+        return SmoothedPrediction(
+            CLASS_NAMES[self.shown],
+            confidence,
+            self.updates >= self.min_updates and confidence >= self.confident_prob,
+        )
+
+
+# ── Inference ─────────────────────────────────────────────────────────────────
+
+@dataclass
+class FrameResult:
+    seq:         int      # frames-slot sequence number of the classified frame
+    captured_at: float    # time.monotonic() at capture
+    latency:     float    # seconds spent in ``predict``
+    value:       Any      # whatever ``predict`` returned
+    smoothed:    SmoothedPrediction | None = None
+
+
+class InferenceWorker(threading.Thread):
+    """
+    Runs ``predict(frame)`` on the newest frame, at most ``max_fps`` times a
+    second, and publishes ``FrameResult``s to ``results``. Frames that arrive
+    while the model is busy (or throttled) are skipped and counted; frames the
+    optional ``detector`` judges unchanged are counted as ``gated``.
+
+    With a ``smoother`` (``predict`` must then return predictor result dicts)
+    each result carries the smoothed reading, and while that reading is
+    confident the rate drops from ``max_fps`` to ``confident_fps``. A scene
+    change reported by the ``detector`` resets the smoother and the rate.
+    """
+
+    def __init__(
+        self,
+        frames: LatestSlot,
+        predict: Callable[[np.ndarray], Any],
+        max_fps: float,
+        detector: ChangeDetector | None = None,
+        smoother: TemporalSmoother | None = None,
+        confident_fps: float = CONFIDENT_FPS,
+    ):
+        super().__init__(name="video-inference", daemon=True)
+        self.frames    = frames
+        self.results   = LatestSlot()
+        self.predict   = predict
+        self.detector  = detector
+        self.smoother  = smoother
+        self.interval  = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.relaxed   = max(self.interval, 1.0 / confident_fps if confident_fps > 0 else 0.0)
+        self.confident = False
+        self.meter     = RateMeter()
+        self.seq       = 0       # last frame taken for inference
+        self.skipped   = 0       # frames never looked at (model busy / throttled)
+        self.gated     = 0       # frames looked at but unchanged — not classified
+        self.latency   = 0.0
+        self._stopping = threading.Event()
+
+    @property
+    def backlog(self) -> int:
+        """Frames captured since the one currently being (or last) classified."""
+        return self.frames.seq - self.seq
+
+    def run(self) -> None:
+        last_started = 0.0
+        while not self._stopping.is_set():
+            interval = self.relaxed if self.confident else self.interval
+            wait = interval - (time.monotonic() - last_started)
+            if wait > 0 and self._stopping.wait(wait):
+                break
+            seq, item = self.frames.wait_newer(self.seq, timeout=0.5)
+            if seq == self.seq:
+                if self.frames.closed:
+                    break
+                continue
+            self.skipped += seq - self.seq - 1
+            self.seq      = seq
+            captured_at, frame = item
+            if self.detector is not None:
+                if not self.detector.should_infer(frame):
+                    self.gated += 1
+                    continue
+                if self.detector.score >= self.detector.threshold:
+                    # New scene: the old reading says nothing about it — back to max_fps.
+                    self.confident = False
+                    if self.smoother is not None:
+                        self.smoother.reset()
+
+            last_started = time.monotonic()
+            try:
+                value = self.predict(frame)
+            except Exception as exc:
+                logger.warning("Webcam inference error: %s", exc)
+                continue
+            self.latency = time.monotonic() - last_started
+            self.meter.tick()
+            smoothed = self.smoother.update(value) if self.smoother is not None else None
+            self.confident = smoothed is not None and smoothed.confident
+            self.results.put(FrameResult(seq, captured_at, self.latency, value, smoothed))
+        self.results.close()
+
+    def stop(self) -> None:
+        self._stopping.set()